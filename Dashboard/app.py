@@ -1,6 +1,15 @@
 # app.py
 import streamlit as st
 from st_pages import Page, show_pages, add_page_title
+from utils.instrumentation import configure_from_environment
+from utils.fast_scorer import get_scorer
+
+# Start the metrics endpoint and JSON logging (see utils/instrumentation.py)
+configure_from_environment()
+
+# Load and warm up the model once per process so that the first prediction does not pay for it (from the compact
+# export when it is up to date, see utils/compact_model.py)
+get_scorer()
 
 # Declare the pages in the app
 show_pages(
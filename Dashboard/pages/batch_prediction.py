@@ -1,8 +1,43 @@
 # batch_prediction.py
 import streamlit as st
 import pandas as pd
-import joblib
+import plotly.express as px
 import io
+import os
+import tempfile
+from utils.batch_scoring import INPUT_FORMATS, OUTPUT_FORMATS, PREVIEW_ROWS, iter_chunks, score_file
+from utils.drift_monitor import DriftMonitor
+from utils.fast_scorer import get_scorer
+from utils.instrumentation import run_page, timer
+from utils.model_zoo import MODEL_NAMES, PRIMARY_MODEL, available_models
+
+# Method to show how the scored batch compares to the training data
+def show_drift_report(report):
+    st.subheader("Data Drift and Quality")
+    st.write(f"Distribution of the {report.rows} rows of the file compared to the training data. "
+             "PSI below 0.1 means a stable distribution, above 0.25 a significant shift.")
+    for issue in report.issues:
+        st.warning(issue)
+    if report.drifted_fields:
+        st.warning(f"Significant drift in: {', '.join(report.drifted_fields)}. "
+                   "Predictions for these customers may be less reliable.")
+    elif not report.issues:
+        st.success("No drift or data quality issues found.")
+
+    table = report.table.sort_values('PSI', ascending=False)
+    with timer('figure', chart='Population Stability Index per Feature'):
+        fig = px.bar(table, x='Feature', y='PSI', color='Drift', title='Population Stability Index per Feature',
+                     color_discrete_map={'stable': 'lightgreen', 'moderate': 'orange', 'significant': 'lightcoral'})
+    st.plotly_chart(fig)
+    st.dataframe(table.round(3), hide_index=True)
+
+
+# Method to forget the result of the previous batch prediction and delete its output file
+def discard_batch_result():
+    previous = st.session_state.pop('batch_result', None)
+    if previous is not None and os.path.exists(previous[1].output_path):
+        os.remove(previous[1].output_path)
+
 
 # Method to show the batch prediction page
 def show_page():
@@ -67,32 +102,130 @@ def show_page():
                        file_name='template_airline_customer_satisfaction.xlsx',
                        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
 
-    st.subheader("Upload Excel File for Prediction")
+    st.subheader("Upload File for Prediction")
+    st.write("Large files are read and scored in chunks, the results are written to a file which can be downloaded "
+             "once the prediction is finished.")
 
-    # File uploader for Excel file
-    uploaded_file = st.file_uploader("Upload an Excel file with customer data", type=["xlsx"])
+    # File uploader for Excel, CSV or Parquet files
+    uploaded_file = st.file_uploader("Upload an Excel, CSV or Parquet file with customer data", type=INPUT_FORMATS)
+
+    # The output of a previous prediction is not needed anymore once the upload is removed or replaced
+    batch_result = st.session_state.get('batch_result')
+    if batch_result is not None and (not uploaded_file or batch_result[0] != uploaded_file.file_id):
+        discard_batch_result()
 
     if uploaded_file:
-        # Read the Excel file
-        input_df = pd.read_excel(uploaded_file)
+        # Only read the first rows of the file for display
+        try:
+            preview = next(iter_chunks(uploaded_file, uploaded_file.name, chunk_size=PREVIEW_ROWS), None)
+        except ValueError as exc:
+            st.error(str(exc))
+            return
+        if preview is None:
+            st.error("The uploaded file does not contain any rows.")
+            return
 
         # Display the input data
-        st.write("Input Data", input_df)
+        st.write(f"Input Data (first {len(preview)} rows)", preview)
+        output_format = st.radio("Output file format", OUTPUT_FORMATS, horizontal=True)
+        workers = st.number_input("Worker processes (for large files)", min_value=1, max_value=os.cpu_count() or 1,
+                                  value=1)
+        recommendations = st.checkbox("Add recommendations for dissatisfied customers",
+                                      help="Adds the three services which contribute most to the predicted "
+                                           "dissatisfaction of each customer")
+        counterfactuals = st.checkbox("Add the rating changes which would satisfy dissatisfied customers",
+                                      help="Searches the smallest improvement of at most three service ratings "
+                                           "which changes the prediction to 'Satisfied'")
+        # Further trained models of the README, see `python -m utils.train_model --classifier`
+        zoo_models = [name for name in available_models() if name != PRIMARY_MODEL]
+        models = []
+        if zoo_models:
+            models = st.multiselect("Also predict with these models (combined with XGBoost into an ensemble)",
+                                    zoo_models, format_func=MODEL_NAMES.get)
+        monitor_drift = st.checkbox("Compare the data with the training data",
+                                    help="Checks every field for drift and data quality issues while the file is "
+                                         "scored")
 
         # Predict customer satisfaction with the uploaded data
         if st.button("Predict Batch Satisfaction"):
-            model = joblib.load('./pages/xgboost.pkl')
-            predictions = model.predict(input_df)
-            input_df['Predicted Satisfaction'] = ['Dissatisfied' if pred == 1 else 'Satisfied' for pred in predictions]
+            scorer = get_scorer()
+            progress_bar = st.progress(0.0, text="Predicting...")
+
+            # Method to update the progress bar after every chunk
+            def show_progress(rows_done, total_rows):
+                if total_rows:
+                    progress_bar.progress(min(rows_done / total_rows, 1.0),
+                                          text=f"Predicted {rows_done} of {total_rows} rows")
+                else:
+                    progress_bar.progress(0.0, text=f"Predicted {rows_done} rows")
+
+            # Remove the output of a previous prediction
+            discard_batch_result()
+
+            output_path = os.path.join(tempfile.gettempdir(),
+                                       f"predictions_{uploaded_file.file_id}.{output_format}")
+            monitor = None
+            try:
+                if monitor_drift:
+                    try:
+                        monitor = DriftMonitor()
+                    except FileNotFoundError:
+                        st.info("The training data is not available, the comparison with the training data "
+                                "is skipped.")
+                with timer('score_file', format=output_format):
+                    result = score_file(uploaded_file, uploaded_file.name, output_path, output_format,
+                                        progress=show_progress, workers=workers,
+                                        recommendations=recommendations, counterfactuals=counterfactuals,
+                                        monitor=monitor, models=tuple(models))
+            except ValueError as exc:
+                progress_bar.empty()
+                st.error(str(exc))
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                # The rows read so far often show what is wrong with the file (e.g. unknown categories)
+                if monitor is not None and monitor.current.rows:
+                    show_drift_report(monitor.report())
+                return
+            progress_bar.empty()
+            drift_report = monitor.report() if monitor is not None else None
+            st.session_state.batch_result = (uploaded_file.file_id, result, scorer, drift_report)
+
+        # Display results of the batch prediction (kept in the session state so that downloading does not reset them)
+        batch_result = st.session_state.get('batch_result')
+        if batch_result is not None and batch_result[0] == uploaded_file.file_id:
+            _, result, scorer, drift_report = batch_result
+            st.write(f"Prediction Results (first {len(result.preview)} rows, see last column of dataframe)",
+                     result.preview)
 
-            # Display results of the batch prediction
-            st.write("Prediction Results (see last column of dataframe)", input_df)
+            with open(result.output_path, 'rb') as output_file:
+                st.download_button(label='Download Prediction Results',
+                                   data=output_file,
+                                   file_name=f"predictions_{os.path.splitext(uploaded_file.name)[0]}."
+                                             f"{os.path.splitext(result.output_path)[1].lstrip('.')}",
+                                   mime='application/octet-stream')
 
-            # Calculate the number of satisfied customers
-            num_satisfied = (input_df['Predicted Satisfaction'] == 'Satisfied').sum()
-            total_customers = input_df.shape[0]
-            st.write(f"Number of Satisfied Customers: {num_satisfied} out of {total_customers}")
-            st.write(f"Percentage of Satisfied Customers: {num_satisfied / total_customers * 100:.2f}%")
+            # Display the number of satisfied customers
+            st.write(f"Number of Satisfied Customers: {result.num_satisfied} out of {result.total_rows}")
+            if result.total_rows:
+                st.write(f"Percentage of Satisfied Customers: "
+                         f"{result.num_satisfied / result.total_rows * 100:.2f}%")
+            # Display how often each service is the most important recommendation
+            if result.recommendation_counts is not None and not result.recommendation_counts.empty:
+                counts = result.recommendation_counts.sort_values(ascending=False)
+                with timer('figure', chart='Most Important Recommendation per Service'):
+                    fig = px.bar(x=counts.index, y=counts.values, title='Most Important Recommendation per Service',
+                                 labels={'x': 'Service', 'y': 'Dissatisfied Customers'})
+                st.plotly_chart(fig)
+            # Compare the additional models with the main prediction
+            if result.model_summary is not None:
+                st.write("Comparison of the models (agreement with the main XGBoost prediction):")
+                st.dataframe(result.model_summary.round(2), hide_index=True)
+            st.caption(f"Scored {result.total_rows} rows in {result.seconds:.2f} s "
+                       f"({result.total_rows / max(result.seconds, 1e-9):.0f} rows/s)")
+            st.caption(f"Model version {scorer.version} ({scorer.source}, loaded in {scorer.load_seconds:.2f} s, "
+                       f"warm-up {scorer.warmup_seconds * 1000:.0f} ms)")
+            if drift_report is not None:
+                show_drift_report(drift_report)
 
 if __name__ == "__main__":
-    show_page()
\ No newline at end of file
+    run_page('batch_prediction', show_page)
\ No newline at end of file
@@ -1,7 +1,14 @@
 # detailed_analysis.py
+import time
 import streamlit as st
-import pandas as pd
 import plotly.express as px
+from utils.chart_aggregation import (RAW_POINTS_THRESHOLD, RENDER_MODES, aggregated_box, aggregated_density,
+                                     aggregated_strip, payload_size, raw_box, raw_scatter, use_aggregation)
+from utils.data_store import load_dataset
+from utils.instrumentation import run_page, timer
+from utils.schema import SERVICE_FEATURES
+from utils.segment_cube import (age_counts, age_group_satisfaction, distribution, filter_cells, get_cube, key_metrics,
+                                rating_histograms)
 
 # Method to show the detailed analysis page
 def show_page():
@@ -13,7 +20,7 @@ def show_page():
 
     # Sidebar filters
     st.sidebar.header("Filters")
-    df = pd.read_csv('./data/Airline_customer_satisfaction.csv')
+    df = load_dataset()
     customer_type = st.sidebar.multiselect("Customer Type", options=df["Customer Type"].unique(),
                                            default=df["Customer Type"].unique())
     travel_type = st.sidebar.multiselect("Type of Travel", options=df["Type of Travel"].unique(),
@@ -21,46 +28,47 @@ def show_page():
     travel_class = st.sidebar.multiselect("Class", options=df["Class"].unique(), default=df["Class"].unique())
 
     # Add age slider
-    min_age = int(df['Age'].min())
-    max_age = int(df['Age'].max())
+    cube = get_cube()
+    min_age = int(cube['Age'].min())
+    max_age = int(cube['Age'].max())
     age_range = st.sidebar.slider("Age Range", min_value=min_age, max_value=max_age, value=(min_age, max_age))
 
-    # Filter data based on selections
-    filtered_df = df[(df["Customer Type"].isin(customer_type)) &
-                     (df["Type of Travel"].isin(travel_type)) &
-                     (df["Class"].isin(travel_class)) &
-                     (df["Age"] >= age_range[0]) &
-                     (df["Age"] <= age_range[1])].copy()
+    # Rendering options for the box and scatter plots
+    render_mode = st.sidebar.radio("Chart Rendering", RENDER_MODES,
+                                   help=f"Automatic aggregates the charts on the server above "
+                                        f"{RAW_POINTS_THRESHOLD} customers.")
+    show_render_stats = st.sidebar.checkbox("Show rendering statistics")
 
-    # Calculate metrics
-    avg_departure_delay = filtered_df['Departure Delay in Minutes'].mean()
-    avg_arrival_delay = filtered_df['Arrival Delay in Minutes'].mean()
-    avg_flight_distance = filtered_df['Flight Distance'].mean()
-    avg_customer_age = filtered_df['Age'].mean()
-    percent_satisfied = (filtered_df['satisfaction'] == 'satisfied').mean() * 100
+    # Select the segments of the pre-aggregated data which match the filters
+    cells = filter_cells(cube, customer_type, travel_type, travel_class, age_range)
+    if cells['count'].sum() == 0:
+        st.warning("No customers match the selected filters.")
+        return
 
-    # Calculate the most booked class and its percentage
-    most_booked_class = filtered_df['Class'].value_counts().idxmax()
+    # Calculate metrics
+    metrics = key_metrics(cells)
 
     # Display metrics
     st.subheader("Key Metrics")
     st.write("The following metrics provide an overview of the data's most important KPIs based on the selected filters.")
     col1, col2, col3 = st.columns(3)
     col4, col5, col6 = st.columns(3)
-    col1.metric("Avg Departure Delay (min)", f"{avg_departure_delay:.2f}")
-    col2.metric("Avg Arrival Delay (min)", f"{avg_arrival_delay:.2f}")
-    col3.metric("Avg Flight Distance (miles)", f"{avg_flight_distance:.2f}")
-    col4.metric("Avg Customer Age", f"{avg_customer_age:.2f}")
-    col5.metric("% Satisfied Customers", f"{percent_satisfied:.2f}%")
-    col6.metric("Most Booked Class", f"{most_booked_class}")
+    col1.metric("Avg Departure Delay (min)", f"{metrics['avg_departure_delay']:.2f}")
+    col2.metric("Avg Arrival Delay (min)", f"{metrics['avg_arrival_delay']:.2f}")
+    col3.metric("Avg Flight Distance (miles)", f"{metrics['avg_flight_distance']:.2f}")
+    col4.metric("Avg Customer Age", f"{metrics['avg_customer_age']:.2f}")
+    col5.metric("% Satisfied Customers", f"{metrics['percent_satisfied']:.2f}%")
+    col6.metric("Most Booked Class", f"{metrics['most_booked_class']}")
 
     st.header("Satisfaction Distribution")
     st.write("The following chart shows the distribution of customer satisfaction.")
-    fig = px.pie(filtered_df, names='satisfaction', title='Satisfaction Distribution')
+    satisfaction_count = distribution(cells, 'satisfaction').reset_index()
+    with timer('figure', chart='Satisfaction Distribution'):
+        fig = px.pie(satisfaction_count, names='satisfaction', values='count', title='Satisfaction Distribution')
     st.plotly_chart(fig)
 
     # Count the number of customers per customer type
-    customer_type_count = filtered_df['Customer Type'].value_counts().reset_index()
+    customer_type_count = distribution(cells, 'Customer Type').reset_index()
     customer_type_count.columns = ['Customer Type', 'Number of Customers']
 
     # Calculate the percentage
@@ -73,15 +81,16 @@ def show_page():
     # Create the bar chart
     st.header("Customer Type Distribution")
     st.write("The following chart shows the distribution of customer types.")
-    fig = px.bar(customer_type_count, x='Customer Type', y='Number of Customers',
-                 title='Customer Type Distribution',
-                 hover_data={'Customer Type': True,
-                             'Number of Customers': True,
-                             'Percentage': True})
+    with timer('figure', chart='Customer Type Distribution'):
+        fig = px.bar(customer_type_count, x='Customer Type', y='Number of Customers',
+                     title='Customer Type Distribution',
+                     hover_data={'Customer Type': True,
+                                 'Number of Customers': True,
+                                 'Percentage': True})
     st.plotly_chart(fig)
 
     # Count the number of customers per class
-    class_count = filtered_df['Class'].value_counts().reset_index()
+    class_count = distribution(cells, 'Class').reset_index()
     class_count.columns = ['Class', 'Number of Customers']
 
     # Calculate the percentage
@@ -94,69 +103,111 @@ def show_page():
     # Create the bar chart
     st.header("Class Distribution")
     st.write("The following chart shows the distribution of classes booked by the customers.")
-    fig = px.bar(class_count, x='Class', y='Number of Customers',
-                 title='Class Distribution',
-                 hover_data={'Class': True,
-                             'Number of Customers': True,
-                             'Percentage': True})  # Ensure Percentage is shown
+    with timer('figure', chart='Class Distribution'):
+        fig = px.bar(class_count, x='Class', y='Number of Customers',
+                     title='Class Distribution',
+                     hover_data={'Class': True,
+                                 'Number of Customers': True,
+                                 'Percentage': True})  # Ensure Percentage is shown
     st.plotly_chart(fig)
 
     st.header("Age Distribution")
     st.write("The following chart shows the distribution of customer ages.")
-    fig = px.histogram(filtered_df, x='Age', title='Age Distribution', nbins=30)
-    fig.update_traces(marker_line_color='white', marker_line_width=1.5)
+    # The number of customers per age is summed up into the same 30 bins as a histogram of the raw ages
+    with timer('figure', chart='Age Distribution'):
+        fig = px.histogram(age_counts(cells).reset_index(), x='Age', y='count', histfunc='sum',
+                           title='Age Distribution', nbins=30)
+        fig.update_traces(marker_line_color='white', marker_line_width=1.5)
+        fig.update_layout(yaxis_title='count')
     st.plotly_chart(fig)
 
-    # Group ages into bins
-    age_bins = [0, 18, 25, 35, 45, 55, 65, 100]
-    age_labels = ['<18', '18-25', '25-35', '35-45', '45-55', '55-65', '65+']
-    filtered_df['Age Group'] = pd.cut(filtered_df['Age'], bins=age_bins, labels=age_labels, right=False)
     # Calculate satisfaction by age group
-    satisfaction_by_age_group = filtered_df.groupby('Age Group', observed=False)['satisfaction'].value_counts(
-        normalize=True).unstack().fillna(0) * 100
+    satisfaction_by_age_group = age_group_satisfaction(cells)
 
     st.header("Satisfaction by Age Group")
     st.write(
         "The following chart shows the percentage of satisfied and dissatisfied customers in each age group and helps "
         "understand which age group is dissatisfied the most.")
-    fig = px.bar(satisfaction_by_age_group, barmode='group', title='Satisfaction by Age Group',
-                 labels={'value': 'Percentage'},
-                 hover_data={'value': ':.2f'})  # Format hover data to two decimal places
+    with timer('figure', chart='Satisfaction by Age Group'):
+        fig = px.bar(satisfaction_by_age_group, barmode='group', title='Satisfaction by Age Group',
+                     labels={'value': 'Percentage'},
+                     hover_data={'value': ':.2f'})  # Format hover data to two decimal places
 
-    # Ensure the percentage sign is displayed correctly in hover data and include age group
-    fig.update_traces(
-        hovertemplate='Age Group: %{x}<br>Satisfaction: %{y:.2f}%<extra></extra>'
-    )
+        # Ensure the percentage sign is displayed correctly in hover data and include age group
+        fig.update_traces(
+            hovertemplate='Age Group: %{x}<br>Satisfaction: %{y:.2f}%<extra></extra>'
+        )
 
     st.plotly_chart(fig)
 
+    # The remaining charts need the individual customers, filter the rows only now (and only the plotted columns).
+    # With many customers they are aggregated on the server instead of sending every row to the browser.
+    aggregate = use_aggregation(render_mode, int(cells['count'].sum()))
+    row_mask = ((df["Customer Type"].isin(customer_type)) &
+                (df["Type of Travel"].isin(travel_type)) &
+                (df["Class"].isin(travel_class)) &
+                (df["Age"] >= age_range[0]) &
+                (df["Age"] <= age_range[1]))
+    plotted_columns = ['satisfaction', 'Flight Distance', 'Departure Delay in Minutes', 'Arrival Delay in Minutes']
+    if not aggregate:
+        plotted_columns += SERVICE_FEATURES
+    filtered_df = df.loc[row_mask, plotted_columns]
+
+    # Drop the categories excluded by the filters so that they do not show up in the charts
+    filtered_df = filtered_df.assign(satisfaction=filtered_df['satisfaction'].cat.remove_unused_categories())
+
+    render_stats = []
+
+    # Method to build and display a chart, recording build time and payload size if requested
+    def show_chart(name, build):
+        start = time.perf_counter()
+        with timer('figure', chart=name):
+            fig = build()
+        if show_render_stats:
+            size = payload_size(fig)
+            render_stats.append({'Chart': name, 'Rendering': 'aggregated' if aggregate else 'raw points',
+                                 'Build + serialize (ms)': round((time.perf_counter() - start) * 1000, 1),
+                                 'Payload (KB)': round(size / 1024, 1)})
+        st.plotly_chart(fig)
+
     # Show additional visualizations (box plots) for further analysis of the data
     st.header("Satisfaction vs Services")
     st.write("The following box plots show the distribution of service ratings for satisfied and dissatisfied customers. "
              "It helps identify which services have the most impact on customer satisfaction.")
-    service_features = ['Seat comfort', 'Food and drink', 'Inflight wifi service', 'Inflight entertainment',
-                        'Online support', 'Ease of Online booking', 'On-board service', 'Leg room service',
-                        'Baggage handling', 'Checkin service', 'Cleanliness', 'Online boarding']
 
-    for feature in service_features:
-        fig = px.box(filtered_df, x='satisfaction', y=feature, title=f'{feature} vs Satisfaction')
-        st.plotly_chart(fig)
+    for feature in SERVICE_FEATURES:
+        if aggregate:
+            show_chart(feature, lambda: aggregated_box(rating_histograms(cells, feature), feature))
+        else:
+            show_chart(feature, lambda: raw_box(filtered_df, feature))
 
     # Scatter plot for flight distance vs satisfaction
     st.header("Flight Distance vs Satisfaction")
     st.write("The following scatter plot shows the relationship between flight distance and customer satisfaction. "
              "It helps understand if longer flights lead to more dissatisfaction.")
-    fig = px.scatter(filtered_df, x='Flight Distance', y='satisfaction', title='Flight Distance vs Satisfaction',
-                     color='satisfaction')
-    st.plotly_chart(fig)
+    if aggregate:
+        st.caption("Aggregated view: number of customers per flight distance bin.")
+        show_chart('Flight Distance', lambda: aggregated_strip(filtered_df, 'Flight Distance',
+                                                               'Flight Distance vs Satisfaction'))
+    else:
+        show_chart('Flight Distance', lambda: raw_scatter(filtered_df, 'Flight Distance', 'satisfaction',
+                                                          'Flight Distance vs Satisfaction'))
 
     # Scatter plot for departure delay vs arrival delay
     st.header("Departure Delay vs Arrival Delay")
     st.write("The following scatter plot shows the relationship between departure delay and arrival delay. "
              "It helps understand if delays in departure lead to delays in arrival and if they impact customer satisfaction.")
-    fig = px.scatter(filtered_df, x='Departure Delay in Minutes', y='Arrival Delay in Minutes',
-                     title='Departure Delay vs Arrival Delay', color='satisfaction')
-    st.plotly_chart(fig)
+    if aggregate:
+        st.caption("Aggregated view: number of customers per delay bin, hover for the share of satisfied customers.")
+        show_chart('Delays', lambda: aggregated_density(filtered_df, 'Departure Delay in Minutes',
+                                                        'Arrival Delay in Minutes', 'Departure Delay vs Arrival Delay'))
+    else:
+        show_chart('Delays', lambda: raw_scatter(filtered_df, 'Departure Delay in Minutes', 'Arrival Delay in Minutes',
+                                                 'Departure Delay vs Arrival Delay'))
+
+    if show_render_stats:
+        st.subheader("Rendering Statistics")
+        st.dataframe(render_stats)
 
 if __name__ == "__main__":
-    show_page()
\ No newline at end of file
+    run_page('detailed_analysis', show_page)
\ No newline at end of file
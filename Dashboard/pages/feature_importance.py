@@ -2,7 +2,9 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import joblib
+from utils.fast_scorer import get_scorer
+from utils.instrumentation import run_page, timer
+from utils.model_registry import get_entry
 
 # Method to show the feature importance page
 def show_page():
@@ -15,22 +17,18 @@ def show_page():
              "Thus, airlines can focus on improving these key features to enhance customer satisfaction.")
 
     # Load the model and extract feature importances
-    model = joblib.load('./pages/xgboost.pkl')
+    model_entry = get_entry()
+    model = model_entry.model
     feature_importances = model.named_steps['classifier'].feature_importances_
 
-    categorical_features = ['Customer Type', 'Class', 'Type of Travel']
-    numerical_features = ['Age', 'Flight Distance', 'Seat comfort', 'Food and drink',
-                          'Inflight wifi service', 'Inflight entertainment', 'Online support',
-                          'Ease of Online booking', 'On-board service', 'Leg room service',
-                          'Baggage handling', 'Checkin service', 'Cleanliness', 'Online boarding',
-                          'Departure Delay in Minutes', 'Arrival Delay in Minutes']
-
-    feature_names = model.named_steps['preprocessor'].transformers_[0][1].named_steps['ohe'].get_feature_names_out(categorical_features).tolist() + numerical_features
+    # Names of the one-hot encoded and numerical model features, in the order of the fitted preprocessor
+    feature_names = get_scorer().feature_names()
     importance_df = pd.DataFrame({'Feature': feature_names, 'Importance': feature_importances})
     importance_df = importance_df.sort_values(by='Importance', ascending=True)
 
     # Display feature importance in a horizontal bar chart
-    fig = px.bar(importance_df, x='Importance', y='Feature', orientation='h', title='Feature Importance')
+    with timer('figure', chart='Feature Importance'):
+        fig = px.bar(importance_df, x='Importance', y='Feature', orientation='h', title='Feature Importance')
     st.plotly_chart(fig)
 
     # Display the top 3 most important features
@@ -39,6 +37,8 @@ def show_page():
     st.write(f"1. {importance_df.iloc[0]['Feature']} - Importance: {importance_df.iloc[0]['Importance']:.2f} of 1.0")
     st.write(f"2. {importance_df.iloc[1]['Feature']} - Importance: {importance_df.iloc[1]['Importance']:.2f} of 1.0")
     st.write(f"3. {importance_df.iloc[2]['Feature']} - Importance: {importance_df.iloc[2]['Importance']:.2f} of 1.0")
+    st.caption(f"Model version {model_entry.version} (loaded in {model_entry.load_seconds:.2f} s, "
+               f"warm-up {model_entry.warmup_seconds * 1000:.0f} ms)")
 
 if __name__ == "__main__":
-    show_page()
\ No newline at end of file
+    run_page('feature_importance', show_page)
\ No newline at end of file
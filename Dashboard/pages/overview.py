@@ -1,6 +1,8 @@
 # overview.py
 import streamlit as st
-import pandas as pd
+from utils.data_store import dataset_shape
+from utils.instrumentation import run_page, timer
+from utils.table_view import get_table_index
 
 # Method to show the overview page
 def show_page():
@@ -17,13 +19,41 @@ def show_page():
         - **Feature Importance**: Display the importance of different features in the XGBoost model used for prediction.
     """)
     st.subheader("Dataset")
-    df = pd.read_csv('./data/Airline_customer_satisfaction.csv')
-    st.write("Below is the data used in this dashboard and for model training (XGBoost):")
-    st.dataframe(df)
-    # Display the number of rows and columns
-    st.write(f"Number of rows: {df.shape[0]}")
-    st.write(f"Number of columns: {df.shape[1]}")
+    table_index = get_table_index()
+    df = table_index.df
+    st.write("Below is the data used in this dashboard and for model training (XGBoost). "
+             "Only the selected page of rows is loaded, use the options to choose columns, filter and sort the data:")
+
+    # Table options: column projection, filters on the categorical columns and sorting
+    with st.expander("Table options"):
+        columns = st.multiselect("Columns", options=list(df.columns), default=list(df.columns))
+        filters = {}
+        filter_columns = st.columns(len(table_index.category_rows))
+        for filter_column, column in zip(filter_columns, table_index.category_rows):
+            categories = list(df[column].cat.categories)
+            filters[column] = filter_column.multiselect(column, options=categories, default=categories)
+        sort_column, order_column, size_column = st.columns(3)
+        sort_by = sort_column.selectbox("Sort by", options=["(original order)"] + list(df.columns))
+        ascending = order_column.radio("Order", options=["Ascending", "Descending"], horizontal=True) == "Ascending"
+        page_size = size_column.selectbox("Rows per page", options=[25, 50, 100, 500], index=2)
+
+    # Only fetch the rows of the visible page
+    sort_by = None if sort_by == "(original order)" else sort_by
+    matching_rows = table_index.count(filters)
+    n_pages = max(1, -(-matching_rows // page_size))
+    # The upper bound is applied afterwards, a changing max_value would reset the widget on every filter change
+    page = min(st.number_input("Page", min_value=1, value=1), n_pages)
+    with timer('table_page'):
+        page_df = table_index.page(page - 1, page_size, columns, filters, sort_by, ascending)
+    st.dataframe(page_df)
+    st.caption(f"Page {page} of {n_pages}: showing rows {min((page - 1) * page_size + 1, matching_rows)}-"
+               f"{min(page * page_size, matching_rows)} of {matching_rows} matching rows")
+
+    # Display the number of rows and columns (read from the file metadata)
+    n_rows, n_columns = dataset_shape()
+    st.write(f"Number of rows: {n_rows}")
+    st.write(f"Number of columns: {n_columns}")
 
 # Display the content
 if __name__ == "__main__":
-    show_page()
\ No newline at end of file
+    run_page('overview', show_page)
\ No newline at end of file
@@ -1,7 +1,14 @@
 # predict_satisfaction.py
 import streamlit as st
 import pandas as pd
-import joblib
+from utils.data_store import load_dataset
+from utils.counterfactuals import MAX_CHANGES, get_search
+from utils.explanations import RECOMMENDATIONS, field_contributions, rank_services
+from utils.fast_scorer import get_scorer
+from utils.instrumentation import run_page
+from utils.model_zoo import MODEL_NAMES, available_models, get_engine
+from utils.prediction_cache import get_prediction_cache
+from utils.schema import SERVICE_FEATURES
 
 # Method to show the prediction page
 def show_page():
@@ -15,8 +22,8 @@ def show_page():
              "it.")
 
     # Read the data and load the model
-    df = pd.read_csv('./data/Airline_customer_satisfaction.csv')
-    model = joblib.load('./pages/xgboost.pkl')
+    df = load_dataset()
+    scorer = get_scorer()
 
     # Input form for user to enter data
     customer_type = st.selectbox("Customer Type", options=df["Customer Type"].unique())
@@ -39,28 +46,28 @@ def show_page():
     departure_delay = st.number_input("Departure Delay in Minutes", min_value=0, max_value=10000, value=0)
     arrival_delay = st.number_input("Arrival Delay in Minutes", min_value=0, max_value=10000, value=0)
 
-    # Create a DataFrame with the input data
-    input_data = pd.DataFrame({
-        'Customer Type': [customer_type],
-        'Class': [travel_class],
-        'Type of Travel': [travel_type],
-        'Age': [age],
-        'Flight Distance': [flight_distance],
-        'Seat comfort': [seat_comfort],
-        'Food and drink': [food_drink],
-        'Inflight wifi service': [inflight_wifi_service],
-        'Inflight entertainment': [inflight_entertainment],
-        'Online support': [online_support],
-        'Ease of Online booking': [online_booking],
-        'On-board service': [onboard_service],
-        'Leg room service': [leg_room_service],
-        'Baggage handling': [baggage_handling],
-        'Checkin service': [checkin_service],
-        'Cleanliness': [cleanliness],
-        'Online boarding': [online_boarding],
-        'Departure Delay in Minutes': [departure_delay],
-        'Arrival Delay in Minutes': [arrival_delay]
-    })
+    # Create a record with the input data (same fields as the batch prediction template)
+    input_record = {
+        'Customer Type': customer_type,
+        'Class': travel_class,
+        'Type of Travel': travel_type,
+        'Age': age,
+        'Flight Distance': flight_distance,
+        'Seat comfort': seat_comfort,
+        'Food and drink': food_drink,
+        'Inflight wifi service': inflight_wifi_service,
+        'Inflight entertainment': inflight_entertainment,
+        'Online support': online_support,
+        'Ease of Online booking': online_booking,
+        'On-board service': onboard_service,
+        'Leg room service': leg_room_service,
+        'Baggage handling': baggage_handling,
+        'Checkin service': checkin_service,
+        'Cleanliness': cleanliness,
+        'Online boarding': online_boarding,
+        'Departure Delay in Minutes': departure_delay,
+        'Arrival Delay in Minutes': arrival_delay
+    }
 
     # Initialize session state variables
     if 'prediction' not in st.session_state:
@@ -70,9 +77,9 @@ def show_page():
 
     # Predict the customer satisfaction
     if st.button("Predict"):
-        # Apply the same preprocessing as during training
-        input_features = model.named_steps['preprocessor'].transform(input_data)
-        prediction = model.named_steps['classifier'].predict(input_features)[0]
+        # Apply the same preprocessing as during training and score the record with the compiled model
+        # (repeated inputs are answered from the prediction cache of the current model version)
+        prediction, _ = get_prediction_cache().predict_record(input_record)
         st.session_state.prediction = 'Satisfied' if prediction == 0 else 'Dissatisfied'
         st.session_state.show_recommendations = False
 
@@ -85,6 +92,21 @@ def show_page():
             "</div>",
             unsafe_allow_html=True
         )
+        st.caption(f"Model version {scorer.version} ({scorer.source}, loaded in {scorer.load_seconds:.2f} s, "
+                   f"warm-up {scorer.warmup_seconds * 1000:.0f} ms)")
+        # Compare the prediction with the other trained models of the README (and their average)
+        models = available_models()
+        if len(models) > 1 and st.checkbox("Compare with the other models"):
+            zoo_prediction = get_engine(models).score_record(input_record)
+            comparison = pd.DataFrame({
+                'Probability of Dissatisfaction (%)': zoo_prediction.probabilities.iloc[0] * 100,
+                'Prediction': zoo_prediction.predictions(scorer.threshold).iloc[0],
+                'Scoring Time (ms)': pd.Series({MODEL_NAMES[name]: seconds * 1000
+                                                for name, seconds in zoo_prediction.model_seconds.items()})},
+                index=zoo_prediction.probabilities.columns)
+            st.dataframe(comparison.round(2))
+            st.caption(f"{len(models)} models, preprocessing {zoo_prediction.preprocess_seconds * 1000:.1f} ms "
+                       f"(shared by models with the same preprocessor)")
         # Show recommendations for dissatisfied customers
         if st.session_state.prediction == 'Dissatisfied':
             # Insert empty line
@@ -93,24 +115,26 @@ def show_page():
                 st.session_state.show_recommendations = True
 
             if st.session_state.show_recommendations:
-                st.write("Based on the customer profile, here are some recommendations to improve satisfaction:")
-                recommendations = {
-                    '**Seat comfort**': "Consider upgrading the seating comfort to improve customer satisfaction.",
-                    '**Food and drink**': "Enhance the quality and variety of food and drinks offered during the flight.",
-                    '**Inflight wifi service**': "Improve the reliability and speed of inflight WiFi services.",
-                    '**Inflight entertainment**': "Provide a wider selection of entertainment options including movies, music, and games.",
-                    '**Online support**': "Enhance online support with quicker response times and more helpful information.",
-                    '**Ease of Online booking**': "Simplify the online booking process and ensure the website is user-friendly.",
-                    '**On-board service**': "Train staff to be more attentive and responsive to customer needs during the flight.",
-                    '**Leg room service**': "Increase the legroom available to passengers to make their flight more comfortable.",
-                    '**Baggage handling**': "Ensure that baggage handling is efficient and that luggage is delivered promptly.",
-                    '**Checkin service**': "Streamline the check-in process and reduce waiting times.",
-                    '**Cleanliness**': "Maintain high standards of cleanliness throughout the flight.",
-                    '**Online boarding**': "Improve the online boarding process for a smoother experience."
-                }
+                st.write("Based on the customer profile, here are some recommendations to improve satisfaction "
+                         "(most important first):")
+                # Rank the services by how much they push this customer towards 'Dissatisfied'
+                contributions = field_contributions(scorer, scorer.encode_record(input_record)[None, :])
+                ranked = [service for service in rank_services(contributions, len(SERVICE_FEATURES))[0] if service]
+                for service in ranked or RECOMMENDATIONS:
+                    st.write(f"- **{service}**: {RECOMMENDATIONS[service]}")
 
-                for feature, recommendation in recommendations.items():
-                    st.write(f"- {recommendation}")
+                # Smallest set of rating improvements which changes the prediction to 'Satisfied'
+                counterfactual = get_search().search_record(input_record)
+                st.write("")
+                if counterfactual.found:
+                    st.write("The customer would be predicted as satisfied with the following rating improvements:")
+                    for service, (old, new) in counterfactual.changes.items():
+                        st.write(f"- **{service}**: {old} → {new}")
+                    st.caption(f"Probability of dissatisfaction after the changes: "
+                               f"{counterfactual.probability * 100:.1f}%")
+                else:
+                    st.write(f"No improvement of at most {MAX_CHANGES} service ratings would change the prediction "
+                             "to satisfied.")
 
 if __name__ == "__main__":
-    show_page()
\ No newline at end of file
+    run_page('predict_satisfaction', show_page)
\ No newline at end of file
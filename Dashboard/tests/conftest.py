@@ -0,0 +1,6 @@
+# conftest.py
+# Makes the dashboard modules importable as `utils.x` (like the pages, which run from the Dashboard directory)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,59 @@
+# test_batch_scoring.py
+# The sheet dimension of xlsx files is only a progress estimate, the rows read decide what is scored
+import io
+import re
+import zipfile
+
+import pandas as pd
+import pytest
+
+from utils.batch_scoring import count_rows, score_file
+from utils.schema import FEATURE_COLUMNS
+from utils.synthetic_data import generate
+
+
+# Method to write a frame as xlsx with the given dimension tag in the sheet (as some applications write it)
+def xlsx_with_dimension(df, dimension):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    patched = io.BytesIO()
+    with zipfile.ZipFile(buffer) as source, zipfile.ZipFile(patched, 'w') as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                data = re.sub(rb'<dimension ref="[^"]*" ?/>', f'<dimension ref="{dimension}"/>'.encode(), data)
+            target.writestr(item, data)
+    patched.seek(0)
+    return patched
+
+
+@pytest.fixture(scope='module')
+def surveys():
+    return generate(30, seed=11)[FEATURE_COLUMNS]
+
+
+def test_wrong_dimension_does_not_reject_the_file(surveys, tmp_path):
+    source = xlsx_with_dimension(surveys, 'A1')
+    assert count_rows(source, 'surveys.xlsx') is None
+    progress = []
+    result = score_file(source, 'surveys.xlsx', str(tmp_path / 'out.csv'),
+                        progress=lambda done, total: progress.append(total))
+    assert result.total_rows == len(surveys)
+    assert progress == [None]
+
+
+def test_too_small_dimension_is_dropped_from_the_progress(surveys, tmp_path):
+    source = xlsx_with_dimension(surveys, 'A1:V10')
+    progress = []
+    result = score_file(source, 'surveys.xlsx', str(tmp_path / 'out.csv'), chunk_size=5,
+                        progress=lambda done, total: progress.append((done, total)))
+    assert result.total_rows == len(surveys)
+    assert progress[0] == (5, 9) and progress[-1] == (len(surveys), None)
+
+
+def test_file_without_rows_is_rejected(tmp_path):
+    source = xlsx_with_dimension(pd.DataFrame(columns=FEATURE_COLUMNS), 'A1:V50')
+    output_path = tmp_path / 'out.csv'
+    with pytest.raises(ValueError, match="no rows"):
+        score_file(source, 'surveys.xlsx', str(output_path))
+    assert not output_path.exists()
@@ -0,0 +1,54 @@
+# test_compact_model.py
+# get_scorer uses the compact export of a model only while it matches the pickled pipeline
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+from utils.compact_model import compact_spec_path, export
+from utils.fast_scorer import CompiledScorer, get_scorer
+from utils.model_registry import MODEL_PATH, get_model
+from utils.schema import FEATURE_COLUMNS
+from utils.synthetic_data import generate
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    path = str(tmp_path / 'xgboost.pkl')
+    shutil.copy(MODEL_PATH, path)
+    return path
+
+
+@pytest.fixture(scope='module')
+def features():
+    return CompiledScorer.from_pipeline(get_model()).transform(generate(3000, seed=5)[FEATURE_COLUMNS])
+
+
+def test_pickle_without_export(model_path):
+    assert get_scorer(model_path).source == 'pickle'
+
+
+def test_up_to_date_export_is_used(model_path, features):
+    export(model_path, compact_spec_path(model_path))
+    scorer = get_scorer(model_path)
+    assert scorer.source == 'compact'
+
+    # Batches of any size are scored by XGBoost and match the pickle exactly
+    expected = CompiledScorer.from_pipeline(get_model()).predict_proba_features(features)
+    for rows in [1, 7, len(features)]:
+        np.testing.assert_array_equal(scorer.predict_proba_features(features[:rows]), expected[:rows])
+    # Single records use the NumPy evaluation of the trees
+    records = generate(3000, seed=5)[FEATURE_COLUMNS].head(50).to_dict(orient='records')
+    probabilities = np.array([scorer.predict_record(record)[1] for record in records])
+    np.testing.assert_allclose(probabilities, expected[:50], rtol=0, atol=1e-6)
+
+
+def test_stale_export_is_ignored(model_path):
+    spec_path, _ = export(model_path, compact_spec_path(model_path))
+    with open(spec_path) as f:
+        spec = json.load(f)
+    spec['source_version'] = 'outdated'
+    with open(spec_path, 'w') as f:
+        json.dump(spec, f)
+    assert get_scorer(model_path).source == 'pickle'
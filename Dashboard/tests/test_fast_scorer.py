@@ -0,0 +1,66 @@
+# test_fast_scorer.py
+# Parity of the compiled scorer with the pickled pipeline (model.predict / predict_proba)
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.fast_scorer import CompiledScorer
+from utils.model_registry import get_model
+from utils.schema import FEATURE_COLUMNS
+from utils.synthetic_data import generate
+
+
+@pytest.fixture(scope='module')
+def model():
+    return get_model()
+
+
+@pytest.fixture(scope='module')
+def scorer(model):
+    return CompiledScorer.from_pipeline(model)
+
+
+@pytest.fixture(scope='module')
+def rows():
+    df = generate(5000, seed=3)[FEATURE_COLUMNS]
+    df = df.astype({column: object for column in ['Customer Type', 'Class', 'Type of Travel']})
+    # Missing values in every kind of field, imputed by the pipeline
+    df.loc[df.index[:20], 'Departure Delay in Minutes'] = np.nan
+    df.loc[df.index[20:40], 'Seat comfort'] = np.nan
+    df.loc[df.index[40:60], 'Class'] = np.nan
+    df.loc[df.index[60:80], 'Customer Type'] = np.nan
+    return df
+
+
+def test_batch_parity(model, scorer, rows):
+    assert rows['Arrival Delay in Minutes'].isna().any()
+    expected = model.predict_proba(rows)[:, 1]
+    np.testing.assert_array_equal(scorer.predict_proba(rows), expected)
+    np.testing.assert_array_equal(scorer.predict(rows), model.predict(rows))
+
+
+def test_record_parity(model, scorer, rows):
+    records = rows.head(100).to_dict(orient='records')
+    expected = model.predict_proba(rows.head(100))[:, 1]
+    for record, probability in zip(records, expected):
+        label, predicted = scorer.predict_record(record)
+        assert predicted == pytest.approx(float(probability), abs=0)
+        assert label == int(probability > 0.5)
+
+
+def test_unknown_category_is_rejected_like_the_pipeline(model, scorer, rows):
+    unknown = rows.head(5).copy()
+    unknown.loc[unknown.index[0], 'Class'] = 'First'
+    with pytest.raises(ValueError):
+        model.predict_proba(unknown)
+    with pytest.raises(ValueError, match='First'):
+        scorer.predict_proba(unknown)
+    with pytest.raises(ValueError, match='First'):
+        scorer.encode_record(unknown.iloc[0].to_dict())
+
+
+def test_empty_input(scorer, rows):
+    probabilities = scorer.predict_proba(rows.head(0))
+    assert probabilities.shape == (0,)
+    assert probabilities.dtype == np.float32
+    assert scorer.predict(pd.DataFrame(columns=FEATURE_COLUMNS)).shape == (0,)
@@ -0,0 +1,87 @@
+# test_model_zoo.py
+# Grouping of the models by preprocessor, the ensemble and the choice of the cheapest model
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.pipeline import Pipeline
+
+from utils import model_zoo
+from utils.batch_scoring import model_column, score_chunk
+from utils.model_registry import MODEL_PATH, get_model
+from utils.model_zoo import ENSEMBLE_NAME, MODEL_NAMES, ModelEngine, cheapest_model
+from utils.schema import FEATURE_COLUMNS
+from utils.synthetic_data import generate
+from utils.train_model import build_preprocessor, build_zoo_classifier, labels
+
+
+@pytest.fixture(scope='module')
+def data():
+    return generate(2000, seed=7)
+
+
+@pytest.fixture(scope='module')
+def zoo(tmp_path_factory, data):
+    # The shipped model, a model which reuses its preprocessor and one with its own preprocessor
+    directory = tmp_path_factory.mktemp('zoo')
+    shutil.copy(MODEL_PATH, directory / 'xgboost.pkl')
+    shared = get_model().named_steps['preprocessor']
+    own = build_preprocessor().fit(data[FEATURE_COLUMNS])
+    for name, preprocessor in [('logistic_regression', shared), ('decision_tree', own)]:
+        classifier = build_zoo_classifier(name).fit(preprocessor.transform(data[FEATURE_COLUMNS]), labels(data))
+        joblib.dump(Pipeline([('preprocessor', preprocessor), ('classifier', classifier)]),
+                    directory / f'{name}.pkl')
+    return directory
+
+
+@pytest.fixture
+def engine(zoo, monkeypatch):
+    monkeypatch.setattr(model_zoo, 'model_path', lambda name: str(zoo / f'{name}.pkl'))
+    return ModelEngine(['xgboost', 'logistic_regression', 'decision_tree'])
+
+
+def test_models_sharing_a_preprocessor_are_grouped(engine):
+    groups = sorted(sorted(names) for _, names in engine.groups.values())
+    assert groups == [['decision_tree'], ['logistic_regression', 'xgboost']]
+
+
+def test_probabilities_and_ensemble(engine, zoo, data):
+    prediction = engine.score(data)
+    assert list(prediction.probabilities.columns) == [MODEL_NAMES[name] for name in engine.names] + [ENSEMBLE_NAME]
+    assert set(prediction.model_seconds) == set(engine.names)
+    for name in engine.names:
+        expected = joblib.load(zoo / f'{name}.pkl').predict_proba(data[FEATURE_COLUMNS])[:, 1]
+        np.testing.assert_allclose(prediction.probabilities[MODEL_NAMES[name]], expected, rtol=1e-6)
+    np.testing.assert_allclose(prediction.probabilities[ENSEMBLE_NAME],
+                               prediction.probabilities[[MODEL_NAMES[name] for name in engine.names]].mean(axis=1))
+    # Records go through the same path as batches
+    record = engine.score_record(data[FEATURE_COLUMNS].iloc[0].to_dict())
+    np.testing.assert_allclose(record.probabilities.iloc[0], prediction.probabilities.iloc[0], rtol=1e-6)
+
+
+def test_batch_ensemble_includes_the_primary_model(engine, data):
+    # The batch page scores the additional models next to the main prediction, the ensemble has to match the
+    # comparison of all models on the Predict Satisfaction page
+    chunk = score_chunk(data, models=('logistic_regression', 'decision_tree'))
+    expected = ModelEngine(['xgboost', 'logistic_regression', 'decision_tree']).score(data).predictions()
+    assert (chunk[model_column(ENSEMBLE_NAME)] == expected[ENSEMBLE_NAME]).all()
+    assert (chunk[model_column(MODEL_NAMES['decision_tree'])] == expected[MODEL_NAMES['decision_tree']]).all()
+    assert model_column(MODEL_NAMES['xgboost']) not in chunk.columns
+
+
+def test_concurrent_xgboost_models_get_their_share_of_the_cores(engine):
+    assert engine.threads == max(1, (model_zoo.os.cpu_count() or 1) // 3)
+    assert engine.classifiers['xgboost'].n_jobs == engine.threads
+    # The shared pipeline keeps its own setting
+    assert engine.entries['xgboost'].model.named_steps['classifier'].n_jobs is None
+
+
+def test_cheapest_model():
+    evaluation = pd.DataFrame({'Model': ['A', 'B', 'C', 'D'], 'AUC': [0.99, 0.96, 0.96, 0.90],
+                               'Rows/s': [1e4, 5e5, 5e5, 1e7], 'Latency (ms)': [2.0, 0.5, 0.3, 0.1]})
+    # D is the fastest but below the bar, B and C are equally fast and C has the lower latency
+    assert cheapest_model(evaluation, 0.95) == 'C'
+    assert cheapest_model(evaluation, 0.98) == 'A'
+    assert cheapest_model(evaluation, 0.995) is None
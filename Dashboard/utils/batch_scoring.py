@@ -0,0 +1,272 @@
+# batch_scoring.py
+# Chunked, memory-bounded batch scoring of uploaded survey files.
+#
+# Input files (xlsx, csv or parquet) are read chunk by chunk: Excel files in openpyxl's read-only streaming
+# mode, CSV files with pandas' chunked reader and Parquet files batch by batch. Every chunk is scored with the
+# compiled scorer and appended to the output file right away, so only one chunk is held in memory at a time.
+import os
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from utils.counterfactuals import add_counterfactuals, get_search
+from utils.explanations import RECOMMENDATION_COLUMNS, add_recommendations
+from utils.fast_scorer import get_scorer
+from utils.instrumentation import timer
+from utils.model_zoo import ENSEMBLE_NAME, MODEL_NAMES, PRIMARY_MODEL, ZooPrediction, get_engine
+from utils.prediction_cache import predict_unique
+from utils.schema import FEATURE_COLUMNS, LABELS, NUMERICAL_FEATURES
+
+CHUNK_SIZE = 50_000
+PREVIEW_ROWS = 100
+PREDICTION_COLUMN = 'Predicted Satisfaction'
+INPUT_FORMATS = ['xlsx', 'csv', 'parquet']
+OUTPUT_FORMATS = ['csv', 'parquet']
+
+
+@dataclass
+class BatchResult:
+    output_path: str
+    total_rows: int = 0
+    num_satisfied: int = 0
+    seconds: float = 0.0
+    # Number of dissatisfied customers per top recommendation
+    recommendation_counts: pd.Series = field(default=None, repr=False)
+    # Satisfied customers, agreement with the main prediction and scoring time per additional model
+    model_summary: pd.DataFrame = field(default=None, repr=False)
+    preview: pd.DataFrame = field(default=None, repr=False)
+
+
+# Method to determine the input format from the file name
+def input_format(file_name):
+    extension = os.path.splitext(file_name)[1].lower().lstrip('.')
+    if extension not in INPUT_FORMATS:
+        raise ValueError(f"Unsupported file type '{extension}', expected one of {', '.join(INPUT_FORMATS)}")
+    return extension
+
+
+# Method to get the number of data rows from the file metadata, None if it is not known without reading the file.
+# For xlsx files this is only an estimate for the progress bar: the sheet dimension is written by the producing
+# application and may be missing, wrong (e.g. 'A1') or include blank rows.
+def count_rows(source, file_name):
+    file_format = input_format(file_name)
+    _rewind(source)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(source).metadata.num_rows
+    if file_format == 'xlsx':
+        from openpyxl import load_workbook
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        max_row = workbook.active.max_row
+        workbook.close()
+        # A sheet which claims to hold no data rows may still have some, the rows read decide
+        return max_row - 1 if max_row and max_row > 1 else None
+    return None
+
+
+def _rewind(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+
+def _iter_xlsx(source, chunk_size):
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        # Read every row in the file, in read-only mode openpyxl would stop at the (possibly wrong) sheet dimension
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(name).strip() if name is not None else '' for name in next(rows, [])]
+        chunk = []
+        for row in rows:
+            if any(value is not None for value in row):
+                chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def _iter_parquet(source, chunk_size):
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+
+# Method to read an input file as a sequence of DataFrames with at most chunk_size rows each
+def iter_chunks(source, file_name, chunk_size=CHUNK_SIZE):
+    file_format = input_format(file_name)
+    _rewind(source)
+    if file_format == 'xlsx':
+        chunks = _iter_xlsx(source, chunk_size)
+    elif file_format == 'parquet':
+        chunks = _iter_parquet(source, chunk_size)
+    else:
+        chunks = pd.read_csv(source, chunksize=chunk_size)
+
+    for chunk in chunks:
+        missing = [column for column in FEATURE_COLUMNS if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"The file is missing the required columns: {', '.join(missing)}")
+        yield chunk
+
+
+# Method to map predicted classes to their labels without a Python loop
+def label_predictions(predictions):
+    return np.asarray(LABELS, dtype=object)[predictions]
+
+
+# Method to get the name of the prediction column of an additional model (or of the ensemble)
+def model_column(model):
+    return f"{PREDICTION_COLUMN} ({model})"
+
+
+# Method to add the prediction of every additional model (and the ensemble) to a chunk, returns the seconds per model.
+# The ensemble averages the additional models with the main prediction (probabilities), like the comparison of all
+# models on the Predict Satisfaction page.
+def add_model_predictions(chunk, engine, probabilities):
+    prediction = engine.score(chunk)
+    columns = [MODEL_NAMES[name] for name in engine.names]
+    zoo_probabilities = prediction.probabilities[columns]
+    predictions = ZooPrediction(zoo_probabilities).predictions()
+    if PRIMARY_MODEL not in engine.names:
+        zoo_probabilities = zoo_probabilities.assign(**{MODEL_NAMES[PRIMARY_MODEL]: probabilities})
+    if len(zoo_probabilities.columns) > 1:
+        ensemble = ZooPrediction(zoo_probabilities.mean(axis=1).to_frame(ENSEMBLE_NAME))
+        predictions[ENSEMBLE_NAME] = ensemble.predictions()[ENSEMBLE_NAME]
+    for model, labels in predictions.items():
+        chunk[model_column(model)] = labels.to_numpy()
+    return prediction.model_seconds
+
+
+# Method to score one chunk, returns the chunk with the predicted satisfaction as last column (followed by the
+# top recommendations, the rating changes which would satisfy dissatisfied customers and the predictions of the
+# additional models of the model zoo if requested). The seconds spent per model are kept in chunk.attrs.
+def score_chunk(chunk, scorer=None, recommendations=False, counterfactuals=False, search=None, models=()):
+    scorer = scorer or get_scorer()
+    chunk = chunk.copy()
+    features = scorer.transform(chunk[FEATURE_COLUMNS])
+    # Duplicate survey rows are scored once
+    probabilities = predict_unique(scorer, features)
+    predictions = (probabilities > scorer.threshold).astype(np.int64)
+    chunk[PREDICTION_COLUMN] = label_predictions(predictions)
+    if recommendations:
+        add_recommendations(chunk, scorer, features, predictions == 1)
+    if counterfactuals:
+        add_counterfactuals(chunk, search or get_search(), features, predictions == 1)
+    if models:
+        chunk.attrs['model_seconds'] = add_model_predictions(chunk, get_engine(models), probabilities)
+    return chunk
+
+
+# Method to summarise the additional models of a batch: share of satisfied customers, agreement with the main
+# prediction, scoring time and throughput
+def summarise_models(columns, satisfied, agreeing, seconds, total_rows):
+    rows = []
+    for model, column in columns.items():
+        # The ensemble costs as much as all its models together (the main prediction is not included)
+        model_seconds = sum(seconds.values()) if model == 'ensemble' else seconds.get(model)
+        rows.append({'Model': MODEL_NAMES.get(model, ENSEMBLE_NAME),
+                     'Satisfied %': satisfied[column] / max(total_rows, 1) * 100,
+                     'Agreement %': agreeing[column] / max(total_rows, 1) * 100,
+                     'Seconds': model_seconds,
+                     'Rows/s': total_rows / model_seconds if model_seconds else None})
+    return pd.DataFrame(rows)
+
+
+class ResultWriter:
+    def __init__(self, output_path, output_format):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format '{output_format}'")
+        self.output_path = output_path
+        self.output_format = output_format
+        self.parquet_writer = None
+        self.rows_written = 0
+
+    def write(self, chunk):
+        if self.output_format == 'csv':
+            chunk.to_csv(self.output_path, mode='w' if self.rows_written == 0 else 'a',
+                         header=self.rows_written == 0, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # Numerical columns are stored as floats, otherwise a chunk with missing values would change the schema
+            chunk = chunk.astype({column: 'float64' for column in NUMERICAL_FEATURES if column in chunk.columns})
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pq.ParquetWriter(self.output_path, table.schema)
+            self.parquet_writer.write_table(table.cast(self.parquet_writer.schema))
+        self.rows_written += len(chunk)
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+
+# Method to score a whole file chunk by chunk and write the results to output_path.
+# progress is called after every chunk with the number of rows scored so far and the total (None if unknown).
+# With workers > 1 the chunks are scored on a pool of worker processes (see parallel_scoring).
+# A DriftMonitor passed as monitor is updated with every chunk as it is read (see drift_monitor).
+def score_file(source, file_name, output_path, output_format='csv', chunk_size=CHUNK_SIZE, progress=None,
+               workers=1, recommendations=False, counterfactuals=False, monitor=None, models=()):
+    total_rows = count_rows(source, file_name)
+    chunks = iter_chunks(source, file_name, chunk_size)
+    if monitor is not None:
+        chunks = monitor.observe(chunks)
+    if workers > 1:
+        from utils.parallel_scoring import parallel_map
+        scored_chunks = parallel_map(chunks, workers, recommendations=recommendations,
+                                     counterfactuals=counterfactuals, models=models)
+    else:
+        scored_chunks = (score_chunk(chunk, recommendations=recommendations, counterfactuals=counterfactuals,
+                                     models=models)
+                         for chunk in chunks)
+
+    # Prediction columns of the additional models and of their ensemble with the main model
+    model_columns = {model: model_column(MODEL_NAMES[model]) for model in models}
+    if len(set(models) | {PRIMARY_MODEL}) > 1:
+        model_columns['ensemble'] = model_column(ENSEMBLE_NAME)
+    satisfied = dict.fromkeys(model_columns.values(), 0)
+    agreeing = dict.fromkeys(model_columns.values(), 0)
+    model_seconds = {}
+
+    result = BatchResult(output_path=output_path)
+    start = time.perf_counter()
+    writer = ResultWriter(output_path, output_format)
+    try:
+        for scored in scored_chunks:
+            with timer('write_results', format=output_format):
+                writer.write(scored)
+            if result.preview is None:
+                result.preview = scored.head(PREVIEW_ROWS)
+            result.total_rows += len(scored)
+            result.num_satisfied += int((scored[PREDICTION_COLUMN] == LABELS[0]).sum())
+            if recommendations:
+                counts = scored[RECOMMENDATION_COLUMNS[0]].value_counts().drop('', errors='ignore')
+                result.recommendation_counts = counts if result.recommendation_counts is None else \
+                    result.recommendation_counts.add(counts, fill_value=0).astype(np.int64)
+            for column in model_columns.values():
+                satisfied[column] += int((scored[column] == LABELS[0]).sum())
+                agreeing[column] += int((scored[column] == scored[PREDICTION_COLUMN]).sum())
+            for model, seconds in scored.attrs.get('model_seconds', {}).items():
+                model_seconds[model] = model_seconds.get(model, 0.0) + seconds
+            if progress is not None:
+                # The row count of xlsx files is an estimate, it is dropped once more rows were read
+                progress(result.total_rows, total_rows if total_rows and total_rows >= result.total_rows else None)
+    finally:
+        writer.close()
+    if result.total_rows == 0:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise ValueError("The file contains no rows")
+    result.seconds = time.perf_counter() - start
+    if models:
+        result.model_summary = summarise_models(model_columns, satisfied, agreeing, model_seconds,
+                                                result.total_rows)
+    return result
@@ -0,0 +1,275 @@
+# benchmarks.py
+# Benchmark suite for the hot paths of the dashboard, run on synthetic data of increasing size.
+#
+# Covered paths: dataset load (CSV parse, columnar copy and in-memory hit), model load and warm-up, single-row
+# prediction latency, batch scoring throughput, the Detailed Analysis filters/KPIs and chart construction, and
+# paging through the Overview table. Every benchmark reports the median and minimum of a few repeats; the
+# results are written to a JSON file together with the commit and environment, and a previous result file can
+# be passed with --compare to flag regressions.
+#
+# Command line usage from the Dashboard directory:
+#     python -m utils.benchmarks --rows 10000,100000,1000000 --output benchmark_results.json
+#     python -m utils.benchmarks --rows 10000 --compare benchmark_results.json
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+
+from utils import data_store
+from utils.batch_scoring import score_chunk, score_file
+from utils.chart_aggregation import (aggregated_box, aggregated_density, aggregated_strip, payload_size, raw_box,
+                                     raw_scatter)
+from utils.fast_scorer import get_scorer
+from utils.model_registry import MODEL_PATH, get_entry, warm_up
+from utils.schema import FEATURE_COLUMNS, SERVICE_FEATURES, TARGET_COLUMN
+from utils.segment_cube import (age_group_satisfaction, build_cube, distribution, filter_cells, key_metrics,
+                                rating_histograms)
+from utils.synthetic_data import write
+from utils.table_view import TableIndex
+
+DEFAULT_ROWS = [10_000, 100_000]
+REPEAT = 5
+SINGLE_ROW_RECORDS = 1_000
+# Raw point charts are only built up to this size, above it the page always aggregates
+MAX_RAW_CHART_ROWS = 100_000
+PAGE_SIZE = 100
+# A slowdown above this factor is reported as a regression by --compare
+TOLERANCE = 1.25
+PACKAGES = ['numpy', 'pandas', 'pyarrow', 'sklearn', 'xgboost', 'plotly', 'streamlit']
+
+# Filter selections of the Detailed Analysis sidebar: everything, one segment and an age range
+FILTERS = [
+    (['Loyal Customer', 'disloyal Customer'], ['Business travel', 'Personal Travel'], ['Business', 'Eco', 'Eco Plus'],
+     (7, 85)),
+    (['Loyal Customer'], ['Business travel'], ['Business'], (7, 85)),
+    (['disloyal Customer'], ['Business travel', 'Personal Travel'], ['Eco', 'Eco Plus'], (25, 45)),
+]
+
+
+# Method to time a function, returns the median and minimum duration of the repeats
+def timed(function, repeat=REPEAT):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return {'median_seconds': statistics.median(durations), 'min_seconds': min(durations), 'repeat': repeat}
+
+
+def _result(name, rows, timing, **extra):
+    return {'benchmark': name, 'rows': rows, **timing, **extra}
+
+
+def bench_dataset_load(path, rows):
+    def parse_csv():
+        data_store.evict(path)
+        columnar = data_store.columnar_path(path)
+        if os.path.exists(columnar):
+            os.remove(columnar)
+        data_store.load_dataset(path)
+
+    def read_columnar():
+        data_store.evict(path)
+        data_store.load_dataset(path)
+
+    return [_result('dataset_load_csv', rows, timed(parse_csv, 3)),
+            _result('dataset_load_columnar', rows, timed(read_columnar)),
+            _result('dataset_load_cached', rows, timed(lambda: data_store.load_dataset(path), 100))]
+
+
+def bench_model_load():
+    model = joblib.load(MODEL_PATH)
+    return [_result('model_load', None, timed(lambda: joblib.load(MODEL_PATH), 3)),
+            _result('model_warmup', None, timed(lambda: warm_up(model)))]
+
+
+def bench_single_row(df, rows):
+    scorer = get_scorer()
+    model = get_entry().model
+    records = df[FEATURE_COLUMNS].head(SINGLE_ROW_RECORDS).to_dict(orient='records')
+    latencies = []
+    for record in records:
+        start = time.perf_counter()
+        scorer.predict_record(record)
+        latencies.append(time.perf_counter() - start)
+    pipeline_rows = df[FEATURE_COLUMNS].head(20)
+    pipeline = timed(lambda: model.predict(pipeline_rows.head(1)), 20)
+    return [_result('predict_single_row', rows,
+                    {'median_seconds': float(np.median(latencies)), 'min_seconds': float(np.min(latencies)),
+                     'repeat': len(latencies)},
+                    p99_seconds=float(np.percentile(latencies, 99))),
+            _result('predict_single_row_pipeline', rows, pipeline)]
+
+
+def bench_batch(df, template_path, rows, output_dir):
+    chunk = df[FEATURE_COLUMNS]
+    output_path = os.path.join(output_dir, 'predictions.parquet')
+
+    def score():
+        with open(template_path, 'rb') as source:
+            score_file(source, template_path, output_path, 'parquet')
+
+    results = []
+    for name, function, repeat in [
+            ('batch_score_file', score, 3),
+            ('batch_score_in_memory', lambda: score_chunk(chunk), 3),
+            ('batch_score_recommendations', lambda: score_chunk(chunk, recommendations=True), 1)]:
+        timing = timed(function, repeat)
+        results.append(_result(name, rows, timing, rows_per_second=rows / timing['median_seconds']))
+    return results
+
+
+def bench_detailed_analysis(df, rows):
+    cube = build_cube(df)
+
+    def recompute():
+        for customer_types, travel_types, classes, age_range in FILTERS:
+            cells = filter_cells(cube, customer_types, travel_types, classes, age_range)
+            key_metrics(cells)
+            distribution(cells, 'Customer Type')
+            age_group_satisfaction(cells)
+
+    def aggregated_charts():
+        cells = filter_cells(cube, *FILTERS[0])
+        figures = [aggregated_box(rating_histograms(cells, feature), feature) for feature in SERVICE_FEATURES]
+        figures.append(aggregated_strip(df, 'Flight Distance', 'Flight Distance'))
+        figures.append(aggregated_density(df, 'Departure Delay in Minutes', 'Arrival Delay in Minutes', 'Delays'))
+        return figures
+
+    def raw_charts():
+        figures = [raw_box(df, feature) for feature in SERVICE_FEATURES]
+        figures.append(raw_scatter(df, 'Flight Distance', TARGET_COLUMN, 'Flight Distance'))
+        figures.append(raw_scatter(df, 'Departure Delay in Minutes', 'Arrival Delay in Minutes', 'Delays'))
+        return figures
+
+    results = [_result('segment_cube_build', rows, timed(lambda: build_cube(df), 3)),
+               _result('filter_kpi_recompute', rows, timed(recompute)),
+               _result('charts_aggregated', rows, timed(aggregated_charts, 3),
+                       payload_bytes=sum(payload_size(fig) for fig in aggregated_charts()))]
+    if rows <= MAX_RAW_CHART_ROWS:
+        results.append(_result('charts_raw', rows, timed(raw_charts, 1),
+                               payload_bytes=sum(payload_size(fig) for fig in raw_charts())))
+    return results
+
+
+def bench_overview(df, rows):
+    index = TableIndex(df)
+    filters = {'Class': ['Business'], 'Customer Type': ['Loyal Customer']}
+
+    def pages():
+        for page in [1, 2, max(1, rows // PAGE_SIZE // 2)]:
+            index.page(page, PAGE_SIZE, filters=filters, sort_by='Flight Distance', ascending=False)
+
+    return [_result('table_index_build', rows, timed(lambda: TableIndex(df), 3)),
+            _result('table_page', rows, timed(pages))]
+
+
+# Method to run all benchmarks for one dataset size, returns the list of results
+def run_size(rows, seed, work_dir):
+    dataset_path = write(os.path.join(work_dir, f"synthetic_{rows}.csv"), rows, seed)
+    template_path = write(os.path.join(work_dir, f"template_{rows}.parquet"), rows, seed, template=True)
+    try:
+        results = bench_dataset_load(dataset_path, rows)
+        df = data_store.load_dataset(dataset_path)
+        results += bench_single_row(df, rows)
+        results += bench_batch(df, template_path, rows, work_dir)
+        results += bench_detailed_analysis(df, rows)
+        results += bench_overview(df, rows)
+    finally:
+        data_store.evict(dataset_path)
+        columnar = data_store.columnar_path(dataset_path)
+        if os.path.exists(columnar):
+            os.remove(columnar)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=data_store.DASHBOARD_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = __import__(package).__version__
+        except ImportError:
+            versions[package] = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'packages': versions}
+
+
+# Method to compare two result files, returns a list of (benchmark, rows, old seconds, new seconds, ratio).
+# The minimum of the repeats is compared, it is much less affected by other load on the machine than the median.
+def compare(old_results, new_results):
+    old = {(result['benchmark'], result['rows']): result for result in old_results['results']}
+    rows = []
+    for result in new_results['results']:
+        previous = old.get((result['benchmark'], result['rows']))
+        if previous is not None:
+            rows.append((result['benchmark'], result['rows'], previous['min_seconds'], result['min_seconds'],
+                         result['min_seconds'] / previous['min_seconds']))
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard hot paths on synthetic data")
+    parser.add_argument('--rows', default=','.join(map(str, DEFAULT_ROWS)),
+                        help="Comma-separated dataset sizes, e.g. 10000,100000,1000000")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="Previous result file to compare against")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Read the baseline first, it may be the file which is about to be overwritten
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report = {'created': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'commit': git_commit(),
+              'environment': environment(), 'results': bench_model_load()}
+    work_dir = tempfile.mkdtemp(prefix='dashboard-benchmarks-')
+    try:
+        for rows in [int(value) for value in args.rows.split(',')]:
+            results = run_size(rows, args.seed, work_dir)
+            for result in results:
+                print(f"{result['benchmark']:>30} {rows:>10} {result['median_seconds'] * 1000:>12.3f} ms", flush=True)
+            report['results'] += results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        regressions = 0
+        print(f"{'benchmark':>30} {'rows':>10} {'old min ms':>12} {'new min ms':>12} {'ratio':>7}")
+        for name, rows, old_seconds, new_seconds, ratio in compare(baseline, report):
+            flag = '  REGRESSION' if ratio > args.tolerance else ''
+            regressions += bool(flag)
+            print(f"{name:>30} {str(rows):>10} {old_seconds * 1000:>12.3f} {new_seconds * 1000:>12.3f} "
+                  f"{ratio:>7.2f}{flag}")
+        if regressions:
+            raise SystemExit(f"{regressions} benchmark(s) slower than {args.tolerance}x the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# chart_aggregation.py
+# Server-side aggregated versions of the heavy charts on the Detailed Analysis page.
+#
+# Box plots are drawn from precomputed quartiles and whiskers (derived from the rating histograms of the segment
+# cube) and scatter plots are replaced by binned density heatmaps, so the payload sent to the browser depends on
+# the number of bins instead of the number of customers. Raw points are still available and are then drawn
+# with WebGL traces.
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from utils.schema import TARGET_COLUMN
+
+# Above this number of customers the charts switch to the aggregated rendering in automatic mode
+RAW_POINTS_THRESHOLD = 5_000
+RENDER_MODES = ['Automatic', 'Aggregated', 'Raw points']
+
+DISTANCE_BINS = 60
+DELAY_BINS = 60
+BOX_COLOR = px.colors.qualitative.Plotly[0]
+
+
+# Method to decide whether the charts are aggregated for a given number of customers
+def use_aggregation(render_mode, n_rows):
+    if render_mode == 'Automatic':
+        return n_rows > RAW_POINTS_THRESHOLD
+    return render_mode == 'Aggregated'
+
+
+# Method to get the value at a (fractional) position of the sorted values described by a histogram
+def _sorted_value(values, cumulative, position):
+    return values[np.searchsorted(cumulative, position, side='right')]
+
+
+# Method to calculate the quartiles (with linear interpolation, as done by plotly.js), whiskers (furthest
+# values within 1.5 IQR) and outliers from a histogram given as distinct values and their counts, None for an
+# empty histogram
+def box_statistics(values, counts):
+    values = np.asarray(values, dtype=np.float64)[np.asarray(counts) > 0]
+    counts = np.asarray(counts)[np.asarray(counts) > 0]
+    if not len(counts):
+        return None
+    cumulative = np.cumsum(counts)
+    n = cumulative[-1]
+
+    def quantile(p):
+        position = min(max(p * n - 0.5, 0), n - 1)
+        lower = int(np.floor(position))
+        upper = min(lower + 1, n - 1)
+        fraction = position - lower
+        return ((1 - fraction) * _sorted_value(values, cumulative, lower) +
+                fraction * _sorted_value(values, cumulative, upper))
+
+    q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+    iqr = q3 - q1
+    inside = (values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)
+    return {
+        'q1': q1, 'median': median, 'q3': q3,
+        'lowerfence': min(q1, values[inside].min()), 'upperfence': max(q3, values[inside].max()),
+        'outliers': values[~inside], 'outlier_counts': counts[~inside]
+    }
+
+
+# Method to draw a box plot of a rating per satisfaction value from its histograms (rows: satisfaction values,
+# columns: ratings)
+def aggregated_box(histograms, feature):
+    stats = {satisfaction: box_statistics(histograms.columns, row.to_numpy())
+             for satisfaction, row in histograms.iterrows()}
+    # Satisfaction values without any customer (e.g. filtered out) get no box
+    names = [name for name, box in stats.items() if box is not None]
+    fig = go.Figure(go.Box(x=names,
+                           q1=[stats[name]['q1'] for name in names],
+                           median=[stats[name]['median'] for name in names],
+                           q3=[stats[name]['q3'] for name in names],
+                           lowerfence=[stats[name]['lowerfence'] for name in names],
+                           upperfence=[stats[name]['upperfence'] for name in names],
+                           name=feature, marker_color=BOX_COLOR, showlegend=False))
+    outlier_x = [name for name in names for _ in stats[name]['outliers']]
+    if outlier_x:
+        fig.add_trace(go.Scatter(x=outlier_x,
+                                 y=np.concatenate([stats[name]['outliers'] for name in names]),
+                                 customdata=np.concatenate([stats[name]['outlier_counts'] for name in names]),
+                                 mode='markers', marker_color=BOX_COLOR,
+                                 hovertemplate='%{y}: %{customdata} customers<extra>outliers</extra>',
+                                 showlegend=False))
+    fig.update_layout(title=f'{feature} vs Satisfaction', xaxis_title=TARGET_COLUMN, yaxis_title=feature)
+    return fig
+
+
+def raw_box(df, feature):
+    return px.box(df, x=TARGET_COLUMN, y=feature, title=f'{feature} vs Satisfaction')
+
+
+# Method to draw the distribution of a numerical column for each satisfaction value as a binned heatmap
+def aggregated_strip(df, x, title, bins=DISTANCE_BINS):
+    values = df[x].to_numpy(dtype=np.float64)
+    edges = np.histogram_bin_edges(values[~np.isnan(values)], bins=bins)
+    groups = df[TARGET_COLUMN].cat.categories
+    counts = np.array([np.histogram(values[(df[TARGET_COLUMN] == group).to_numpy()], bins=edges)[0]
+                       for group in groups])
+    fig = go.Figure(go.Heatmap(x=(edges[:-1] + edges[1:]) / 2, y=list(groups), z=counts,
+                               colorscale='Blues', colorbar_title='Customers',
+                               hovertemplate=f'{x}: %{{x:.0f}}<br>{TARGET_COLUMN}: %{{y}}<br>'
+                                             'Customers: %{z}<extra></extra>'))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=TARGET_COLUMN)
+    return fig
+
+
+# Method to draw the joint distribution of two numerical columns as a 2D binned density heatmap, the colour
+# shows the number of customers (log scale) and the hover text the share of satisfied customers in each bin
+def aggregated_density(df, x, y, title, bins=DELAY_BINS):
+    data = df[[x, y, TARGET_COLUMN]].dropna(subset=[x, y])
+    x_values = data[x].to_numpy(dtype=np.float64)
+    y_values = data[y].to_numpy(dtype=np.float64)
+    satisfied = (data[TARGET_COLUMN] == 'satisfied').to_numpy()
+
+    counts, x_edges, y_edges = np.histogram2d(x_values, y_values, bins=bins)
+    satisfied_counts, _, _ = np.histogram2d(x_values[satisfied], y_values[satisfied], bins=[x_edges, y_edges])
+    # Values are rounded and empty bins left blank, this keeps the JSON payload small
+    with np.errstate(divide='ignore', invalid='ignore'):
+        share = np.where(counts > 0, np.round(satisfied_counts / counts * 100, 1), np.nan)
+        z = np.where(counts > 0, np.round(np.log10(counts), 2), np.nan)
+
+    fig = go.Figure(go.Heatmap(x=np.round((x_edges[:-1] + x_edges[1:]) / 2, 1),
+                               y=np.round((y_edges[:-1] + y_edges[1:]) / 2, 1),
+                               z=z.T.astype(np.float32), customdata=np.dstack([counts.T, share.T]).astype(np.float32),
+                               colorscale='Viridis', colorbar_title='Customers (log10)',
+                               hovertemplate=f'{x}: %{{x:.0f}}<br>{y}: %{{y:.0f}}<br>Customers: %{{customdata[0]}}<br>'
+                                             '% satisfied: %{customdata[1]:.1f}%<extra></extra>'))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+    return fig
+
+
+def raw_scatter(df, x, y, title):
+    return px.scatter(df, x=x, y=y, title=title, color=TARGET_COLUMN, render_mode='webgl')
+
+
+# Method to measure the size of the JSON sent to the browser for a figure
+def payload_size(fig):
+    return len(fig.to_json())
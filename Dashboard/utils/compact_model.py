@@ -0,0 +1,416 @@
+# compact_model.py
+# Compact, sklearn-free model artifact for a fast cold start.
+#
+# `export` turns the pickled pipeline into two files: the booster in XGBoost's native UBJSON format and a
+# small JSON spec with everything the compiled scorer needs from the preprocessor (categorical columns and
+# their one-hot categories, imputation values, numerical column order, scaling) plus the model feature names.
+# `load_compact` builds a CompiledScorer from these files without unpickling anything. Importing xgboost also
+# imports sklearn when it is installed, so the loader does not use xgboost either: the UBJSON file is decoded
+# here and the trees are evaluated with NumPy, following XGBoost's float32 arithmetic (split on value < threshold,
+# leaf values summed in tree order, sigmoid of the margin). This evaluation answers single records, so a cold start
+# needs neither sklearn nor xgboost. Batches and the tree contributions are handed to XGBoost, imported on first use,
+# so that batch results are exactly those of the pickled model (the NumPy sigmoid can differ in the last bit).
+#
+# `get_scorer` uses the export when its spec was made from the current pickle (same content hash), and compiles
+# the pickle otherwise, so a stale export is never used.
+#
+# Command line usage from the Dashboard directory:
+#     python -m utils.compact_model export                 # writes pages/xgboost.ubj and pages/xgboost.spec.json
+#     python -m utils.compact_model check                  # prediction parity against the pickled pipeline
+#     python -m utils.compact_model compare                # cold start time and resident memory of both formats
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from utils.fast_scorer import CompiledScorer
+from utils.model_registry import DASHBOARD_DIR, MODEL_PATH
+
+COMPACT_SPEC_PATH = os.path.join(DASHBOARD_DIR, 'pages', 'xgboost.spec.json')
+FORMAT_NAME = 'airline-satisfaction-compact'
+FORMAT_VERSION = 1
+# Rows evaluated at a time, bounds the size of the (rows x trees) node arrays
+BLOCK_ROWS = 4096
+
+_NUMBER_TYPES = {b'i': '>i1', b'U': '>u1', b'I': '>i2', b'l': '>i4', b'L': '>i8', b'd': '>f4', b'D': '>f8'}
+
+
+class UBJSONReader:
+    # Minimal decoder for the Universal Binary JSON files written by XGBoost (typed arrays become NumPy arrays)
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def _read(self, size):
+        chunk = self.data[self.pos:self.pos + size]
+        if len(chunk) < size:
+            raise ValueError("Unexpected end of UBJSON data")
+        self.pos += size
+        return chunk
+
+    def _peek(self):
+        return self.data[self.pos:self.pos + 1]
+
+    def _number(self, marker):
+        dtype = np.dtype(_NUMBER_TYPES[marker])
+        return np.frombuffer(self._read(dtype.itemsize), dtype)[0].item()
+
+    def _string(self):
+        return self._read(self._number(self._read(1))).decode('utf-8')
+
+    def value(self, marker=None):
+        marker = marker or self._read(1)
+        while marker == b'N':
+            marker = self._read(1)
+        if marker in _NUMBER_TYPES:
+            return self._number(marker)
+        if marker in (b'S', b'H'):
+            return self._string()
+        if marker == b'C':
+            return self._read(1).decode('ascii')
+        if marker in (b'T', b'F', b'Z'):
+            return {b'T': True, b'F': False, b'Z': None}[marker]
+        if marker == b'[':
+            return self._array()
+        if marker == b'{':
+            return self._object()
+        raise ValueError(f"Unsupported UBJSON marker {marker!r} at byte {self.pos - 1}")
+
+    def _container_header(self):
+        item_type = count = None
+        if self._peek() == b'$':
+            self.pos += 1
+            item_type = self._read(1)
+        if self._peek() == b'#':
+            self.pos += 1
+            count = self._number(self._read(1))
+        return item_type, count
+
+    def _array(self):
+        item_type, count = self._container_header()
+        if item_type in _NUMBER_TYPES and count is not None:
+            dtype = np.dtype(_NUMBER_TYPES[item_type])
+            values = np.frombuffer(self._read(dtype.itemsize * count), dtype)
+            return values.astype(dtype.newbyteorder('='))
+        if count is not None:
+            return [self.value(item_type) for _ in range(count)]
+        items = []
+        while self._peek() != b']':
+            items.append(self.value())
+        self.pos += 1
+        return items
+
+    def _object(self):
+        item_type, count = self._container_header()
+        result = {}
+        if count is not None:
+            for _ in range(count):
+                key = self._string()
+                result[key] = self.value(item_type)
+            return result
+        while self._peek() != b'}':
+            key = self._string()
+            result[key] = self.value()
+        self.pos += 1
+        return result
+
+
+def read_ubjson(path):
+    with open(path, 'rb') as f:
+        return UBJSONReader(f.read()).value()
+
+
+class TreeEnsemble:
+    # Stand-in for the xgboost Booster used by CompiledScorer, evaluates the trees of a binary:logistic model.
+    # The nodes of all trees are stored in flat arrays, leaves point to themselves so that every row can take
+    # max_depth steps.
+    def __init__(self, left, right, feature, threshold, default_left, leaf_value, roots, max_depth, base_margin,
+                 path=None):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.default_left = default_left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.base_margin = np.float32(base_margin)
+        # Booster file of the ensemble, loaded into XGBoost for the tree contributions and, with use_native, for
+        # every prediction
+        self.path = path
+        self.use_native = False
+        self.params = {}
+        self._native = None
+
+    @classmethod
+    def from_model(cls, model):
+        learner = model['learner']
+        objective = learner['objective']['name']
+        if objective != 'binary:logistic':
+            raise ValueError(f"Only binary:logistic models are supported, got '{objective}'")
+        booster = learner['gradient_booster']
+        if booster.get('name', 'gbtree') != 'gbtree':
+            raise ValueError(f"Only tree boosters are supported, got '{booster.get('name')}'")
+
+        arrays = {name: [] for name in ['left', 'right', 'feature', 'threshold', 'default_left']}
+        roots, max_depth, offset = [], 0, 0
+        for tree in booster['model']['trees']:
+            if len(tree.get('categories_nodes', [])):
+                raise ValueError("Categorical splits are not supported")
+            left = np.asarray(tree['left_children'], dtype=np.int64)
+            right = np.asarray(tree['right_children'], dtype=np.int64)
+            n_nodes = len(left)
+            leaves = left == -1
+            nodes = np.arange(n_nodes)
+            # Children are always allocated after their parent, so one pass gives the depth of every node
+            depth = np.zeros(n_nodes, dtype=np.int64)
+            for node in nodes[~leaves]:
+                depth[left[node]] = depth[right[node]] = depth[node] + 1
+            max_depth = max(max_depth, int(depth.max()))
+
+            arrays['left'].append(np.where(leaves, nodes, left) + offset)
+            arrays['right'].append(np.where(leaves, nodes, right) + offset)
+            arrays['feature'].append(np.where(leaves, 0, np.asarray(tree['split_indices'], dtype=np.int64)))
+            # For leaves the split condition holds the leaf value
+            arrays['threshold'].append(np.asarray(tree['split_conditions'], dtype=np.float32))
+            arrays['default_left'].append(np.asarray(tree['default_left'], dtype=bool))
+            roots.append(offset)
+            offset += n_nodes
+
+        flat = {name: np.concatenate(values) for name, values in arrays.items()}
+        # The base score is stored as a probability, XGBoost adds its logit to the margin
+        base_score = np.float32(float(learner['learner_model_param']['base_score']))
+        base_margin = -np.log(np.float32(1.0) / base_score - np.float32(1.0))
+        return cls(flat['left'], flat['right'], flat['feature'], flat['threshold'], flat['default_left'],
+                   flat['threshold'], np.array(roots), max_depth, base_margin)
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.ubj'):
+            ensemble = cls.from_model(read_ubjson(path))
+        else:
+            with open(path) as f:
+                ensemble = cls.from_model(json.load(f))
+        ensemble.path = path
+        return ensemble
+
+    # The tree arrays are shared between copies, every copy has its own parameters and XGBoost booster
+    def copy(self):
+        ensemble = copy.copy(self)
+        ensemble.params = dict(self.params)
+        ensemble._native = None
+        return ensemble
+
+    # Parameters (e.g. nthread) only apply to XGBoost, the NumPy evaluation is single-threaded
+    def set_param(self, params):
+        self.params.update(params)
+        if self._native is not None:
+            self._native.set_param(params)
+
+    # Method to get the same model as an XGBoost booster, loaded on first use
+    def native(self):
+        if self._native is None:
+            if self.path is None:
+                raise ValueError("The tree ensemble was not loaded from a file")
+            import xgboost as xgb
+
+            booster = xgb.Booster(model_file=self.path)
+            booster.set_param(self.params)
+            self._native = booster
+        return self._native
+
+    # Method to get the tree contributions (same signature as Booster.predict), evaluated by XGBoost
+    def predict(self, data, **kwargs):
+        return self.native().predict(data, **kwargs)
+
+    def num_boosted_rounds(self):
+        return len(self.roots)
+
+    def _margin(self, features, roots):
+        rows = np.arange(len(features))[:, np.newaxis]
+        nodes = np.broadcast_to(roots, (len(features), len(roots))).copy()
+        for _ in range(self.max_depth):
+            values = features[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(values), self.default_left[nodes], values < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        # Sum the leaf values in tree order in float32, like XGBoost does
+        leaf_values = np.concatenate([np.full((len(features), 1), self.base_margin, dtype=np.float32),
+                                      self.leaf_value[nodes]], axis=1)
+        return np.cumsum(leaf_values, axis=1, dtype=np.float32)[:, -1]
+
+    # Method to get the probability of class 1 (same signature as Booster.inplace_predict)
+    def inplace_predict(self, features, iteration_range=(0, 0)):
+        if self.use_native:
+            return self.native().inplace_predict(features, iteration_range=tuple(iteration_range))
+        features = np.asarray(features, dtype=np.float32)
+        start, end = iteration_range
+        roots = self.roots[start:end or len(self.roots)]
+        margin = np.concatenate([self._margin(features[block:block + BLOCK_ROWS], roots)
+                                 for block in range(0, len(features), BLOCK_ROWS)] or
+                                [np.empty(0, dtype=np.float32)])
+        # exp in float64 rounded to float32 matches the expf of XGBoost far more often than NumPy's float32 exp
+        exp = np.exp(np.minimum(-margin, np.float32(88.7)).astype(np.float64)).astype(np.float32)
+        return np.float32(1.0) / (exp + np.float32(1.0))
+
+
+# Method to get the path of the booster file belonging to a spec file
+def booster_path(spec_path):
+    return spec_path[:-len('.spec.json')] + '.ubj' if spec_path.endswith('.spec.json') else spec_path + '.ubj'
+
+
+# Method to get the location of the compact export of a pickled model (pages/xgboost.pkl -> pages/xgboost.spec.json)
+def compact_spec_path(model_path):
+    return os.path.splitext(model_path)[0] + '.spec.json'
+
+
+# Method to get the version of the pickle a compact export was made from, None if there is no valid export
+def spec_version(spec_path):
+    try:
+        with open(spec_path) as f:
+            spec = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if spec.get('format') != FORMAT_NAME or spec.get('format_version') != FORMAT_VERSION:
+        return None
+    if not os.path.exists(os.path.join(os.path.dirname(os.path.abspath(spec_path)), spec['booster'])):
+        return None
+    return spec.get('source_version')
+
+
+# Method to export the pickled pipeline into the compact format, returns the paths of the spec and booster files
+def export(model_path=MODEL_PATH, spec_path=COMPACT_SPEC_PATH):
+    from utils.model_registry import get_entry
+
+    # Compiled from the pipeline itself, get_scorer may already return the previous compact export
+    entry = get_entry(model_path)
+    scorer = CompiledScorer.from_pipeline(entry.model)
+    ubj_path = booster_path(spec_path)
+    scorer.booster.save_model(ubj_path)
+    spec = {
+        'format': FORMAT_NAME,
+        'format_version': FORMAT_VERSION,
+        'source_version': entry.version,
+        'booster': os.path.basename(ubj_path),
+        'objective': 'binary:logistic',
+        'threshold': scorer.threshold,
+        'iteration_range': list(scorer.iteration_range),
+        'categorical_columns': scorer.categorical_columns,
+        'categories': [[str(value) for value in values] for values in scorer.categories],
+        'categorical_fill': [str(value) for value in scorer.categorical_fill],
+        'numerical_columns': scorer.numerical_columns,
+        'numerical_fill': scorer.numerical_fill.tolist(),
+        'numerical_mean': scorer.numerical_mean.tolist(),
+        'numerical_scale': scorer.numerical_scale.tolist(),
+        'feature_names': scorer.feature_names(),
+    }
+    tmp_path = f"{spec_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(spec, f, indent=2)
+    os.replace(tmp_path, spec_path)
+    return spec_path, ubj_path
+
+
+# Method to load a scorer from the compact format (neither sklearn nor xgboost are imported)
+def load_compact(spec_path=COMPACT_SPEC_PATH):
+    with open(spec_path) as f:
+        spec = json.load(f)
+    if spec.get('format') != FORMAT_NAME or spec.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"{spec_path} is not a compact model spec of version {FORMAT_VERSION}")
+    ensemble = TreeEnsemble.load(os.path.join(os.path.dirname(os.path.abspath(spec_path)), spec['booster']))
+    scorer = CompiledScorer(ensemble, spec['categorical_columns'], spec['categories'], spec['categorical_fill'],
+                            spec['numerical_columns'], spec['numerical_fill'], spec['numerical_mean'],
+                            spec['numerical_scale'], spec['iteration_range'], spec['threshold'])
+    # predict_proba_features (batches, any number of rows) goes through XGBoost, predict_record through NumPy
+    scorer.booster.use_native = True
+    scorer.row_booster.use_native = False
+    return scorer
+
+
+# Method to compare the compact scorer with the scorer compiled from the pickle, both for batches and for the NumPy
+# evaluation of single records, returns the number of differing predictions and the largest probability difference
+def check_parity(spec_path, df, model_path=MODEL_PATH):
+    from utils.model_registry import get_entry
+    from utils.schema import FEATURE_COLUMNS
+
+    scorer = CompiledScorer.from_pipeline(get_entry(model_path).model)
+    expected = scorer.predict_proba_features(scorer.transform(df[FEATURE_COLUMNS]))
+    compact = load_compact(spec_path)
+    features = compact.transform(df[FEATURE_COLUMNS])
+    mismatches, max_difference = 0, 0.0
+    for predicted in [compact.predict_proba_features(features),
+                      compact.row_booster.inplace_predict(features, iteration_range=compact.iteration_range)]:
+        mismatches = max(mismatches, int(((expected > 0.5) != (predicted > 0.5)).sum()))
+        max_difference = max(max_difference, float(np.abs(expected - predicted).max()))
+    return mismatches, max_difference
+
+
+# Code run in a fresh interpreter to measure the cold start of a format: imports, load and the first prediction
+COLD_START_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+from utils.model_registry import WARMUP_RECORD
+if sys.argv[1] == 'pickle':
+    import joblib
+    import pandas as pd
+    model = joblib.load(sys.argv[2])
+    model.predict_proba(pd.DataFrame([WARMUP_RECORD]))
+else:
+    from utils.compact_model import load_compact
+    load_compact(sys.argv[2]).predict_record(WARMUP_RECORD)
+seconds = time.perf_counter() - start
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({'seconds': seconds, 'rss_mb': rss_kb / 1024, 'sklearn_imported': 'sklearn' in sys.modules,
+                  'xgboost_imported': 'xgboost' in sys.modules}))
+'''
+
+
+# Method to measure the cold start of the pickle and the compact format in fresh interpreters
+def compare_cold_start(spec_path=COMPACT_SPEC_PATH, model_path=MODEL_PATH, repeat=3):
+    results = {}
+    for name, path in [('pickle', model_path), ('compact', spec_path)]:
+        runs = [json.loads(subprocess.run([sys.executable, '-c', COLD_START_SCRIPT, name, path], cwd=DASHBOARD_DIR,
+                                          capture_output=True, text=True, check=True).stdout)
+                for _ in range(repeat)]
+        results[name] = {**runs[0], 'seconds': min(run['seconds'] for run in runs),
+                         'rss_mb': min(run['rss_mb'] for run in runs)}
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export and check the compact model artifact")
+    parser.add_argument('command', choices=['export', 'check', 'compare'])
+    parser.add_argument('--model', default=MODEL_PATH, help="Pickled pipeline")
+    parser.add_argument('--spec', default=COMPACT_SPEC_PATH, help="Spec file of the compact artifact")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'export':
+        spec_path, ubj_path = export(args.model, args.spec)
+        print(f"Wrote {spec_path} ({os.path.getsize(spec_path)} bytes) and {ubj_path} "
+              f"({os.path.getsize(ubj_path)} bytes), pickle has {os.path.getsize(args.model)} bytes")
+    elif args.command == 'check':
+        from utils.data_store import load_dataset
+        df = load_dataset()
+        mismatches, max_difference = check_parity(args.spec, df, args.model)
+        print(f"Parity on {len(df)} rows: {mismatches} differing predictions, "
+              f"max probability difference {max_difference:.3g}")
+    else:
+        results = compare_cold_start(args.spec, args.model)
+        print(f"{'format':>8} {'cold start s':>12} {'RSS MB':>8} {'sklearn':>8} {'xgboost':>8}")
+        for name, result in results.items():
+            print(f"{name:>8} {result['seconds']:>12.2f} {result['rss_mb']:>8.1f} "
+                  f"{str(result['sklearn_imported']):>8} {str(result['xgboost_imported']):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# counterfactuals.py
+# Counterfactual search: the smallest set of service rating improvements which turns a customer predicted as
+# 'Dissatisfied' into 'Satisfied'.
+#
+# Candidates are built directly in the model's feature space (only the scaled service columns change) and scored
+# as one matrix per step, for many customers at a time. The search goes level by level (1, 2, ... improved
+# services): every subset of improvable services is first screened with all its services raised to 5, and only
+# the subsets which flip the prediction at the maximum are expanded into the grid of intermediate ratings, from
+# which the candidate with the fewest added rating points is picked. This pruning assumes that a better rating
+# does not make a customer less likely to be satisfied. Customers leave the search as soon as they are resolved,
+# and scored candidates are kept in an LRU cache so that reruns for the same customer do not call the model.
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from utils.fast_scorer import get_scorer
+from utils.instrumentation import timer
+from utils.model_registry import MODEL_PATH, artifact_version
+from utils.schema import SERVICE_FEATURES
+
+MAX_RATING = 5
+MAX_CHANGES = 3
+# Number of flipping subsets per customer which are expanded into the grid of intermediate ratings
+MAX_EXPANDED_SUBSETS = 8
+# Number of customers searched together, bounds the size of the candidate matrices
+BLOCK_SIZE = 256
+CACHE_SIZE = 200_000
+COUNTERFACTUAL_COLUMN = 'Rating Changes to Satisfy'
+
+
+@dataclass
+class Counterfactual:
+    found: bool
+    # Service -> (current rating, improved rating)
+    changes: dict = field(default_factory=dict)
+    # Probability of 'Dissatisfied' after the changes
+    probability: float = float('nan')
+
+    def describe(self):
+        if not self.found:
+            return f"No change of at most {MAX_CHANGES} ratings found"
+        return '; '.join(f"{service} {old} -> {new}" for service, (old, new) in self.changes.items())
+
+
+class CounterfactualSearch:
+    def __init__(self, scorer, services=SERVICE_FEATURES, max_changes=MAX_CHANGES,
+                 max_expanded_subsets=MAX_EXPANDED_SUBSETS, cache_size=CACHE_SIZE):
+        self.scorer = scorer
+        self.services = list(services)
+        self.max_changes = max_changes
+        self.max_expanded_subsets = max_expanded_subsets
+        self.cache_size = cache_size
+
+        positions = [scorer.numerical_columns.index(service) for service in self.services]
+        self.columns = scorer.n_categorical + np.array(positions)
+        # Encoded value of every rating of every service, computed like CompiledScorer.transform
+        ratings = np.arange(MAX_RATING + 1, dtype=np.float64)
+        self.encoded = ((ratings[np.newaxis, :] - scorer.numerical_mean[positions, np.newaxis]) /
+                        scorer.numerical_scale[positions, np.newaxis]).astype(np.float32)
+        self.subsets = {k: np.array(list(itertools.combinations(range(len(self.services)), k)))
+                        for k in range(1, max_changes + 1)}
+        # Rating increments of every grid point per subset size
+        self.increments = {k: np.array(list(itertools.product(range(1, MAX_RATING + 1), repeat=k)))
+                           for k in range(1, max_changes + 1)}
+
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Method to get the probability of 'Dissatisfied' of candidate rows, only rows not seen before are scored
+    def score(self, features):
+        keys = [row.tobytes() for row in features]
+        probabilities = np.empty(len(keys), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                probability = self._cache.get(key)
+                if probability is None:
+                    missing.append(i)
+                else:
+                    probabilities[i] = probability
+                    self._cache.move_to_end(key)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            probabilities[missing] = self.scorer.predict_proba_features(features[missing])
+            with self._lock:
+                for i in missing:
+                    self._cache[keys[i]] = probabilities[i]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return probabilities
+
+    # Method to replace the services of every row by the given ratings (subsets and ratings have shape rows x k)
+    def _apply(self, features, subsets, ratings):
+        rows = features.copy()
+        rows[np.arange(len(rows))[:, np.newaxis], self.columns[subsets]] = self.encoded[subsets, ratings]
+        return rows
+
+    # Method to keep the first max_count entries of every group in arrays sorted by group
+    @staticmethod
+    def _first_per_group(groups, max_count):
+        starts = np.r_[0, np.flatnonzero(np.diff(groups)) + 1]
+        rank = np.arange(len(groups)) - np.repeat(starts, np.diff(np.r_[starts, len(groups)]))
+        return rank < max_count
+
+    def _search_block(self, features, ratings):
+        n_rows = len(features)
+        new_ratings = ratings.copy()
+        probabilities = np.full(n_rows, np.nan)
+        found = np.zeros(n_rows, dtype=bool)
+        threshold = self.scorer.threshold
+
+        for k, subsets in self.subsets.items():
+            unresolved = np.flatnonzero(~found)
+            if not len(unresolved):
+                break
+
+            # Screening: raise every subset of improvable services to the maximum rating
+            improvable = (ratings[unresolved][:, subsets] < MAX_RATING).all(axis=2)
+            customers, subset_ids = np.nonzero(improvable)
+            if not len(customers):
+                continue
+            customers = unresolved[customers]
+            screened = self.score(self._apply(features[customers], subsets[subset_ids],
+                                              np.full((len(customers), k), MAX_RATING)))
+            flips = screened <= threshold
+            if not flips.any():
+                continue
+
+            # Expand only the most promising flipping subsets of every customer
+            customers, subset_ids, screened = customers[flips], subset_ids[flips], screened[flips]
+            order = np.lexsort((screened, customers))
+            customers, subset_ids = customers[order], subset_ids[order]
+            keep = self._first_per_group(customers, self.max_expanded_subsets)
+            customers, subset_ids = customers[keep], subset_ids[keep]
+
+            # Grid of intermediate ratings above the current ones
+            increments = self.increments[k]
+            current = ratings[customers[:, np.newaxis], subsets[subset_ids]]
+            candidate_ratings = current[:, np.newaxis, :] + increments[np.newaxis, :, :]
+            pairs, points = np.nonzero((candidate_ratings <= MAX_RATING).all(axis=2))
+            candidate_ratings = candidate_ratings[pairs, points]
+            candidate_customers = customers[pairs]
+            candidate_subsets = subsets[subset_ids[pairs]]
+            scores = self.score(self._apply(features[candidate_customers], candidate_subsets, candidate_ratings))
+
+            # Cheapest flipping candidate per customer (ties broken by the lowest probability of 'Dissatisfied')
+            flipping = np.flatnonzero(scores <= threshold)
+            cost = increments[points[flipping]].sum(axis=1)
+            order = flipping[np.lexsort((scores[flipping], cost, candidate_customers[flipping]))]
+            best = order[self._first_per_group(candidate_customers[order], 1)]
+            for i in best:
+                customer = candidate_customers[i]
+                new_ratings[customer, candidate_subsets[i]] = candidate_ratings[i]
+                probabilities[customer] = scores[i]
+                found[customer] = True
+        return new_ratings, probabilities, found
+
+    # Method to search the counterfactuals of many customers, features are the model features and ratings the
+    # current service ratings (integers, missing ratings are left unchanged). Returns the improved ratings, the
+    # probability of 'Dissatisfied' after the changes and whether a counterfactual was found for each customer.
+    def search(self, features, ratings, workers=1):
+        ratings = np.asarray(ratings, dtype=np.float64)
+        # Missing ratings are imputed by the model and never suggested as a change
+        ratings = np.clip(np.floor(np.nan_to_num(ratings, nan=MAX_RATING)), 0, MAX_RATING).astype(np.int64)
+        with timer('counterfactual_search'):
+            return self._search(features, ratings, workers)
+
+    def _search(self, features, ratings, workers):
+        blocks = [(features[start:start + BLOCK_SIZE], ratings[start:start + BLOCK_SIZE])
+                  for start in range(0, len(features), BLOCK_SIZE)]
+        if workers > 1 and len(blocks) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda block: self._search_block(*block), blocks))
+        else:
+            results = [self._search_block(*block) for block in blocks]
+        if not results:
+            return ratings, np.full(0, np.nan), np.zeros(0, dtype=bool)
+        new_ratings, probabilities, found = (np.concatenate(parts) for parts in zip(*results))
+        return new_ratings, probabilities, found
+
+    # Method to search the counterfactual of a single record (dict with the 19 input fields)
+    def search_record(self, record):
+        features = self.scorer.encode_record(record)[np.newaxis, :]
+        ratings = np.array([[record[service] for service in self.services]], dtype=np.float64)
+        new_ratings, probabilities, found = self.search(features, ratings)
+        return self._counterfactual(ratings[0], new_ratings[0], probabilities[0], found[0])
+
+    def _counterfactual(self, ratings, new_ratings, probability, found):
+        changes = {service: (int(old), int(new)) for service, old, new in zip(self.services, ratings, new_ratings)
+                   if found and old != new}
+        return Counterfactual(found=bool(found), changes=changes, probability=float(probability))
+
+    # Method to describe the counterfactuals of a batch, '' for customers which were not searched
+    def describe_batch(self, ratings, new_ratings, probabilities, found):
+        return [self._counterfactual(old, new, probability, is_found).describe()
+                for old, new, probability, is_found in zip(ratings, new_ratings, probabilities, found)]
+
+
+_lock = threading.Lock()
+_searches = {}
+
+
+# Method to get the counterfactual search of a model artifact, recreated (with an empty cache) when the model changes
+def get_search(path=MODEL_PATH):
+    path = os.path.abspath(path)
+    version = artifact_version(path)
+    cached = _searches.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _searches.get(path)
+        if cached is None or cached[0] != version:
+            cached = (version, CounterfactualSearch(get_scorer(path)))
+            _searches[path] = cached
+        return cached[1]
+
+
+# Method to add the rating changes which would satisfy the dissatisfied customers of a scored chunk
+def add_counterfactuals(chunk, search, features, dissatisfied, workers=1):
+    descriptions = np.full(len(chunk), '', dtype=object)
+    if dissatisfied.any():
+        ratings = chunk.loc[dissatisfied, search.services].to_numpy(dtype=np.float64, na_value=np.nan)
+        new_ratings, probabilities, found = search.search(features[dissatisfied], ratings, workers)
+        current = np.clip(np.floor(np.nan_to_num(ratings, nan=MAX_RATING)), 0, MAX_RATING)
+        descriptions[dissatisfied] = search.describe_batch(current, new_ratings, probabilities, found)
+    chunk[COUNTERFACTUAL_COLUMN] = descriptions
+    return chunk
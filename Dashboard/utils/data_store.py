@@ -0,0 +1,103 @@
+# data_store.py
+# Shared, read-only access to the airline customer satisfaction dataset.
+#
+# The CSV is parsed only once: it is converted into a typed Parquet copy (categoricals and small ints)
+# which is stored next to the source file and re-created whenever the CSV changes. The loaded frame is
+# kept in memory and handed to every page and every session of the Streamlit process, so callers must
+# treat it as read-only and copy before adding columns.
+import os
+import threading
+
+import pandas as pd
+
+from utils.instrumentation import timer
+from utils.schema import DATASET_DTYPES
+
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(DASHBOARD_DIR, 'data', 'Airline_customer_satisfaction.csv')
+CACHE_DIR = os.path.join(DASHBOARD_DIR, 'data', '.cache')
+
+_lock = threading.Lock()
+_frames = {}
+
+
+# Method to identify a version of the source file (changes whenever the file is replaced or edited)
+def source_fingerprint(path=DATA_PATH):
+    stat = os.stat(path)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+# Method to get the location of the columnar copy belonging to a given version of the source file
+def columnar_path(path=DATA_PATH, fingerprint=None):
+    fingerprint = fingerprint or source_fingerprint(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{name}-{fingerprint}.parquet")
+
+
+# Method to convert the CSV into the typed columnar format and remove copies of older versions
+def _convert(path, fingerprint):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    target = columnar_path(path, fingerprint)
+    with timer('csv_parse'):
+        df = pd.read_csv(path)
+        df = df.astype({column: dtype for column, dtype in DATASET_DTYPES.items() if column in df.columns})
+
+    # Write to a temporary file first so that concurrent readers never see a partial file
+    tmp_target = f"{target}.{os.getpid()}.tmp"
+    with timer('columnar_write'):
+        df.to_parquet(tmp_target, index=False)
+    os.replace(tmp_target, target)
+
+    prefix = os.path.splitext(os.path.basename(path))[0] + '-'
+    for file_name in os.listdir(CACHE_DIR):
+        stale = os.path.join(CACHE_DIR, file_name)
+        if file_name.startswith(prefix) and file_name.endswith('.parquet') and stale != target:
+            os.remove(stale)
+    return df
+
+
+# Method to load the dataset; all callers in the process share the same frame
+def load_dataset(path=DATA_PATH):
+    path = os.path.abspath(path)
+    fingerprint = source_fingerprint(path)
+    cached = _frames.get(path)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    with _lock:
+        cached = _frames.get(path)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        target = columnar_path(path, fingerprint)
+        if os.path.exists(target):
+            with timer('columnar_read'):
+                df = pd.read_parquet(target)
+        else:
+            df = _convert(path, fingerprint)
+        _frames[path] = (fingerprint, df)
+        return df
+
+
+# Method to drop a dataset from memory, the next load reads the columnar copy again (e.g. for benchmarks)
+def evict(path=DATA_PATH):
+    with _lock:
+        _frames.pop(os.path.abspath(path), None)
+
+
+# Method to get the fingerprint of the dataset version currently held in memory (e.g. as a cache key)
+def dataset_version(path=DATA_PATH):
+    load_dataset(path)
+    return _frames[os.path.abspath(path)][0]
+
+
+# Method to get the number of rows and columns from the metadata of the columnar copy, without loading the data
+def dataset_shape(path=DATA_PATH):
+    import pyarrow.parquet as pq
+
+    path = os.path.abspath(path)
+    target = columnar_path(path)
+    if not os.path.exists(target):
+        load_dataset(path)
+    metadata = pq.read_metadata(target)
+    return metadata.num_rows, len(metadata.schema.names)
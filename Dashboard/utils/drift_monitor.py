@@ -0,0 +1,370 @@
+# drift_monitor.py
+# One-pass drift and data quality monitor for scored batches.
+#
+# A DataProfile summarises the 19 input fields with constant memory and can be updated chunk by chunk:
+# numerical fields keep a running count, mean and variance (Welford's algorithm, merged per chunk), min/max and a
+# histogram over fixed bin edges, categorical fields keep their value frequencies. Missing, non-numeric, negative
+# and out-of-range values (ratings outside 0-5) are counted along the way. The profile of the training data is
+# computed once per version of the dataset and stored next to its columnar copy. A DriftMonitor updates the profile
+# of a batch while its chunks are read for scoring (so the file is not read a second time) and compares it with
+# the training profile: the population stability index (PSI) and the Kolmogorov-Smirnov statistic on the binned
+# distributions per field, plus a list of data quality issues.
+#
+# Run `python -m utils.drift_monitor batch.csv` from the Dashboard directory to print the report of a file.
+import argparse
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from utils.data_store import CACHE_DIR, DATA_PATH, load_dataset, source_fingerprint
+from utils.instrumentation import timer
+from utils.schema import CATEGORICAL_FEATURES, NUMERICAL_FEATURES, SERVICE_FEATURES
+
+PROFILE_VERSION = 1
+# Number of quantile bins of the continuous fields (Age, Flight Distance and the delays)
+QUANTILE_BINS = 10
+# Further categories of a field are counted together, so that a column of free text cannot grow the profile
+MAX_CATEGORIES = 50
+OTHER_CATEGORY = '(other)'
+MIN_RATING, MAX_RATING = 0, 5
+# PSI below 0.1 is usually considered stable, above 0.25 a significant shift
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Increase of the missing share (in percentage points) above which missing values are reported
+MISSING_TOLERANCE = 1.0
+# Small share used for empty bins, keeps the PSI finite
+EPSILON = 1e-4
+
+
+class NumericStats:
+    # edges are the inner bin edges, values are binned as edges[i - 1] <= value < edges[i]
+    def __init__(self, edges, integer=False):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.integer = integer
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.missing = 0
+        self.non_numeric = 0
+        self.negative = 0
+        self.out_of_range = 0
+        self.histogram = np.zeros(len(self.edges) + 1, dtype=np.int64)
+
+    def update(self, series):
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        invalid = np.isnan(values)
+        # Values which are present but cannot be parsed are counted as non-numeric only
+        non_numeric = int((invalid & series.notna().to_numpy()).sum())
+        self.non_numeric += non_numeric
+        self.missing += int(invalid.sum()) - non_numeric
+        values = values[~invalid]
+        if not len(values):
+            return
+
+        # Merge the chunk's mean and sum of squared deviations into the running ones (Chan et al.)
+        chunk_mean = values.mean()
+        chunk_m2 = float(((values - chunk_mean) ** 2).sum())
+        total = self.count + len(values)
+        delta = chunk_mean - self.mean
+        self.mean += delta * len(values) / total
+        self.m2 += chunk_m2 + delta ** 2 * self.count * len(values) / total
+        self.count = total
+
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        self.negative += int((values < 0).sum())
+        if self.integer:
+            self.out_of_range += int(((values < MIN_RATING) | (values > MAX_RATING) | (values != np.round(values)))
+                                     .sum())
+        self.histogram += np.bincount(np.searchsorted(self.edges, values, side='right'),
+                                      minlength=len(self.histogram))
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {'edges': self.edges.tolist(), 'integer': self.integer, 'count': self.count, 'mean': self.mean,
+                'm2': self.m2, 'minimum': self.minimum, 'maximum': self.maximum, 'missing': self.missing,
+                'non_numeric': self.non_numeric, 'negative': self.negative, 'out_of_range': self.out_of_range,
+                'histogram': self.histogram.tolist()}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['edges'], data['integer'])
+        for name in ['count', 'mean', 'm2', 'minimum', 'maximum', 'missing', 'non_numeric', 'negative',
+                     'out_of_range']:
+            setattr(stats, name, data[name])
+        stats.histogram = np.asarray(data['histogram'], dtype=np.int64)
+        return stats
+
+    def empty_copy(self):
+        return NumericStats(self.edges, self.integer)
+
+
+class CategoricalStats:
+    def __init__(self):
+        self.counts = {}
+        self.missing = 0
+
+    def update(self, series):
+        self.missing += int(series.isna().sum())
+        # Count the raw values first, only the distinct values are converted to stripped strings
+        for value, value_count in series.value_counts(dropna=True, sort=False).items():
+            if not value_count:
+                continue
+            value = str(value).strip()
+            if value not in self.counts and len(self.counts) >= MAX_CATEGORIES:
+                value = OTHER_CATEGORY
+            self.counts[value] = self.counts.get(value, 0) + int(value_count)
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+    def to_dict(self):
+        return {'counts': self.counts, 'missing': self.missing}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.counts = dict(data['counts'])
+        stats.missing = data['missing']
+        return stats
+
+    def empty_copy(self):
+        return CategoricalStats()
+
+
+class DataProfile:
+    def __init__(self, fields):
+        self.fields = fields
+        self.rows = 0
+
+    # Method to create an empty profile with the bin edges of the training data
+    @classmethod
+    def for_training(cls, df):
+        fields = {column: CategoricalStats() for column in CATEGORICAL_FEATURES}
+        for column in NUMERICAL_FEATURES:
+            if column in SERVICE_FEATURES:
+                # One bin per rating
+                fields[column] = NumericStats(np.arange(MIN_RATING, MAX_RATING) + 0.5, integer=True)
+            else:
+                values = pd.to_numeric(df[column], errors='coerce').dropna().to_numpy(dtype=np.float64)
+                quantiles = np.quantile(values, np.linspace(0, 1, QUANTILE_BINS + 1)[1:-1]) if len(values) else []
+                fields[column] = NumericStats(np.unique(quantiles))
+        return cls(fields)
+
+    # Method to create an empty profile which is binned like this one
+    def empty_copy(self):
+        return DataProfile({column: stats.empty_copy() for column, stats in self.fields.items()})
+
+    def update(self, chunk):
+        with timer('drift_update'):
+            for column, stats in self.fields.items():
+                stats.update(chunk[column])
+            self.rows += len(chunk)
+
+    def to_dict(self):
+        return {'version': PROFILE_VERSION, 'rows': self.rows,
+                'fields': {column: {'type': 'categorical' if isinstance(stats, CategoricalStats) else 'numeric',
+                                    **stats.to_dict()} for column, stats in self.fields.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        fields = {column: (CategoricalStats if stats['type'] == 'categorical' else NumericStats).from_dict(stats)
+                  for column, stats in data['fields'].items()}
+        profile = cls(fields)
+        profile.rows = data['rows']
+        return profile
+
+
+# Method to compute the PSI and the KS statistic of two binned distributions (counts in the same bins)
+def compare_distributions(expected, actual):
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    if expected.sum() == 0 or actual.sum() == 0:
+        return float('nan'), float('nan')
+    expected_share = expected / expected.sum()
+    actual_share = actual / actual.sum()
+    ks = float(np.abs(np.cumsum(expected_share) - np.cumsum(actual_share)).max())
+    expected_share = np.clip(expected_share, EPSILON, None)
+    actual_share = np.clip(actual_share, EPSILON, None)
+    psi = float(((actual_share - expected_share) * np.log(actual_share / expected_share)).sum())
+    return psi, ks
+
+
+# Method to classify a PSI value
+def drift_level(psi):
+    if np.isnan(psi):
+        return 'no data'
+    if psi >= PSI_SIGNIFICANT:
+        return 'significant'
+    return 'moderate' if psi >= PSI_MODERATE else 'stable'
+
+
+def _share(part, total):
+    return part / total * 100 if total else 0.0
+
+
+@dataclass
+class DriftReport:
+    rows: int
+    # One row per input field: PSI, KS, drift level, missing shares and means
+    table: pd.DataFrame = field(repr=False)
+    # Data quality issues found in the batch
+    issues: list = field(default_factory=list)
+
+    @property
+    def drifted_fields(self):
+        return self.table.loc[self.table['Drift'] == 'significant', 'Feature'].tolist()
+
+
+# Method to compare the profile of a batch with the training profile
+def compare_profiles(reference, current):
+    rows, issues = [], []
+    for column, expected in reference.fields.items():
+        actual = current.fields[column]
+        row = {'Feature': column,
+               'Missing % (batch)': _share(actual.missing, current.rows),
+               'Missing % (training)': _share(expected.missing, reference.rows)}
+
+        if isinstance(expected, CategoricalStats):
+            categories = list(expected.counts) + [value for value in actual.counts if value not in expected.counts]
+            psi, ks = compare_distributions([expected.counts.get(value, 0) for value in categories],
+                                            [actual.counts.get(value, 0) for value in categories])
+            row.update({'Mean (batch)': np.nan, 'Mean (training)': np.nan, 'Mean Shift (SD)': np.nan})
+            unseen = [value for value in actual.counts if value not in expected.counts]
+            if unseen:
+                issues.append(f"{column}: values not seen in the training data ({', '.join(map(repr, unseen))}), "
+                              f"{sum(actual.counts[value] for value in unseen)} rows")
+        else:
+            psi, ks = compare_distributions(expected.histogram, actual.histogram)
+            shift = (actual.mean - expected.mean) / expected.std if actual.count and expected.std else np.nan
+            row.update({'Mean (batch)': actual.mean if actual.count else np.nan, 'Mean (training)': expected.mean,
+                        'Mean Shift (SD)': shift})
+            if actual.non_numeric:
+                issues.append(f"{column}: {actual.non_numeric} non-numeric values")
+            if actual.out_of_range:
+                issues.append(f"{column}: {actual.out_of_range} ratings outside {MIN_RATING}-{MAX_RATING} or not "
+                              "whole numbers")
+            elif actual.negative:
+                issues.append(f"{column}: {actual.negative} negative values")
+
+        if row['Missing % (batch)'] > row['Missing % (training)'] + MISSING_TOLERANCE:
+            issues.append(f"{column}: {row['Missing % (batch)']:.1f}% missing values "
+                          f"(training data: {row['Missing % (training)']:.1f}%)")
+        row.update({'PSI': psi, 'KS': ks, 'Drift': drift_level(psi)})
+        rows.append(row)
+
+    table = pd.DataFrame(rows, columns=['Feature', 'PSI', 'KS', 'Drift', 'Missing % (batch)', 'Missing % (training)',
+                                        'Mean (batch)', 'Mean (training)', 'Mean Shift (SD)'])
+    return DriftReport(rows=current.rows, table=table, issues=issues)
+
+
+_lock = threading.Lock()
+_profiles = {}
+
+
+# Method to get the location of the stored training profile belonging to a given version of the dataset
+def profile_path(path=DATA_PATH, fingerprint=None):
+    fingerprint = fingerprint or source_fingerprint(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{name}-{fingerprint}.profile.json")
+
+
+def _build_training_profile(path, fingerprint):
+    df = load_dataset(path)
+    profile = DataProfile.for_training(df)
+    profile.update(df)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    target = profile_path(path, fingerprint)
+    tmp_target = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_target, 'w') as f:
+        json.dump(profile.to_dict(), f)
+    os.replace(tmp_target, target)
+
+    prefix = os.path.splitext(os.path.basename(path))[0] + '-'
+    for file_name in os.listdir(CACHE_DIR):
+        stale = os.path.join(CACHE_DIR, file_name)
+        if file_name.startswith(prefix) and file_name.endswith('.profile.json') and stale != target:
+            os.remove(stale)
+    return profile
+
+
+# Method to get the profile of the training data, computed once per version of the dataset
+def get_training_profile(path=DATA_PATH):
+    path = os.path.abspath(path)
+    fingerprint = source_fingerprint(path)
+    cached = _profiles.get(path)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    with _lock:
+        cached = _profiles.get(path)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        target = profile_path(path, fingerprint)
+        profile = None
+        if os.path.exists(target):
+            with open(target) as f:
+                data = json.load(f)
+            if data.get('version') == PROFILE_VERSION:
+                profile = DataProfile.from_dict(data)
+        if profile is None:
+            with timer('training_profile'):
+                profile = _build_training_profile(path, fingerprint)
+        _profiles[path] = (fingerprint, profile)
+        return profile
+
+
+class DriftMonitor:
+    def __init__(self, reference=None):
+        self.reference = reference or get_training_profile()
+        self.current = self.reference.empty_copy()
+
+    def update(self, chunk):
+        self.current.update(chunk)
+
+    # Method to update the profile with every chunk of a sequence of chunks while passing them on
+    def observe(self, chunks):
+        for chunk in chunks:
+            self.update(chunk)
+            yield chunk
+
+    def report(self):
+        return compare_profiles(self.reference, self.current)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare a survey file with the training data")
+    parser.add_argument('path', help="Input file (xlsx, csv or parquet)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from utils.batch_scoring import iter_chunks
+
+    args = parse_args(argv)
+    monitor = DriftMonitor()
+    with open(args.path, 'rb') as source:
+        for chunk in iter_chunks(source, args.path):
+            monitor.update(chunk)
+    report = monitor.report()
+    print(f"{report.rows} rows")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(report.table.round(3).to_string(index=False))
+    for issue in report.issues:
+        print(f"- {issue}")
+
+
+if __name__ == "__main__":
+    main()
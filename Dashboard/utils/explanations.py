@@ -0,0 +1,78 @@
+# explanations.py
+# Per-customer drivers and service recommendations based on the tree contributions of the XGBoost model.
+#
+# XGBoost's pred_contribs output (TreeSHAP) splits every prediction into one contribution per model feature plus
+# a bias, in log-odds of the customer being dissatisfied. The contributions of the one-hot columns are summed
+# back into their original categorical fields, and the services with a positive contribution (those pushing the
+# customer towards 'Dissatisfied') are ranked to pick the recommendations. Everything is evaluated for a whole
+# batch with one booster call and matrix operations.
+#
+# Exact TreeSHAP costs a few milliseconds per row with this model, so batches use the approximate (Saabas)
+# contributions instead, which walk only the decision path of each tree and are about 100x faster. Single
+# customers on the Predict Satisfaction page get the exact values.
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import timer
+from utils.schema import FEATURE_COLUMNS, SERVICE_FEATURES
+
+RECOMMENDATIONS = {
+    'Seat comfort': "Consider upgrading the seating comfort to improve customer satisfaction.",
+    'Food and drink': "Enhance the quality and variety of food and drinks offered during the flight.",
+    'Inflight wifi service': "Improve the reliability and speed of inflight WiFi services.",
+    'Inflight entertainment': "Provide a wider selection of entertainment options including movies, music, and games.",
+    'Online support': "Enhance online support with quicker response times and more helpful information.",
+    'Ease of Online booking': "Simplify the online booking process and ensure the website is user-friendly.",
+    'On-board service': "Train staff to be more attentive and responsive to customer needs during the flight.",
+    'Leg room service': "Increase the legroom available to passengers to make their flight more comfortable.",
+    'Baggage handling': "Ensure that baggage handling is efficient and that luggage is delivered promptly.",
+    'Checkin service': "Streamline the check-in process and reduce waiting times.",
+    'Cleanliness': "Maintain high standards of cleanliness throughout the flight.",
+    'Online boarding': "Improve the online boarding process for a smoother experience."
+}
+
+TOP_RECOMMENDATIONS = 3
+RECOMMENDATION_COLUMNS = [f'Recommendation {i + 1}' for i in range(TOP_RECOMMENDATIONS)]
+
+
+# Method to build the matrix which sums the contributions of the model features into the 19 input fields
+def field_matrix(scorer):
+    fields = [column for column, categories in zip(scorer.categorical_columns, scorer.categories)
+              for _ in categories] + list(scorer.numerical_columns)
+    matrix = np.zeros((len(fields), len(FEATURE_COLUMNS)), dtype=np.float32)
+    matrix[np.arange(len(fields)), [FEATURE_COLUMNS.index(field) for field in fields]] = 1.0
+    return matrix
+
+
+# Method to calculate the contribution of every input field to the predictions of a batch, returns a DataFrame
+# with one column per input field and the bias (in log-odds of 'Dissatisfied')
+def field_contributions(scorer, features, approximate=False):
+    # Imported here, scoring with the compact model does not need xgboost otherwise
+    import xgboost as xgb
+
+    with timer('contributions'):
+        contributions = scorer.booster.predict(xgb.DMatrix(features), pred_contribs=True,
+                                               approx_contribs=approximate, iteration_range=scorer.iteration_range)
+    by_field = contributions[:, :-1] @ field_matrix(scorer)
+    result = pd.DataFrame(by_field, columns=FEATURE_COLUMNS)
+    result['Bias'] = contributions[:, -1]
+    return result
+
+
+# Method to rank the services driving each customer towards dissatisfaction, returns an array with the names of
+# the top services per customer ('' where fewer services have a positive contribution)
+def rank_services(contributions, top_n=TOP_RECOMMENDATIONS):
+    services = contributions[SERVICE_FEATURES].to_numpy()
+    order = np.argsort(-services, axis=1, kind='stable')[:, :top_n]
+    positive = np.take_along_axis(services, order, axis=1) > 0
+    return np.where(positive, np.asarray(SERVICE_FEATURES, dtype=object)[order], '')
+
+
+# Method to add the top recommendations for the dissatisfied customers of a scored chunk
+def add_recommendations(chunk, scorer, features, dissatisfied):
+    ranked = np.full((len(chunk), TOP_RECOMMENDATIONS), '', dtype=object)
+    if dissatisfied.any():
+        ranked[dissatisfied] = rank_services(field_contributions(scorer, features[dissatisfied], approximate=True))
+    for i, column in enumerate(RECOMMENDATION_COLUMNS):
+        chunk[column] = ranked[:, i]
+    return chunk
@@ -0,0 +1,222 @@
+# fast_scorer.py
+# Low-latency scoring path compiled from the trained sklearn pipeline.
+#
+# The fitted preprocessing steps (most frequent / mean imputation, one-hot encoding and standard scaling)
+# are folded into a few NumPy lookup arrays, so that a record can be turned into the model's float32 feature
+# vector without pandas or sklearn and handed directly to the XGBoost booster. Results are identical to
+# calling predict on the pipeline.
+#
+# Run `python -m utils.fast_scorer` from the Dashboard directory to check parity against the pipeline on the
+# bundled dataset and to measure the single-row latency.
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import ROWS_SCORED_METRIC, count, timer
+from utils.model_registry import MODEL_PATH, WARMUP_RECORD, artifact_version, get_entry
+from utils.schema import FEATURE_COLUMNS, LABELS
+
+
+class CompiledScorer:
+    def __init__(self, booster, categorical_columns, categories, categorical_fill, numerical_columns,
+                 numerical_fill, numerical_mean, numerical_scale, iteration_range=(0, 0), threshold=0.5):
+        self.booster = booster
+        # Single rows are scored on a single-threaded copy, spinning up the thread pool costs more than the trees
+        self.row_booster = booster.copy()
+        self.row_booster.set_param({'nthread': 1})
+        self.categorical_columns = list(categorical_columns)
+        self.categories = [list(values) for values in categories]
+        self.categorical_fill = list(categorical_fill)
+        self.numerical_columns = list(numerical_columns)
+        self.numerical_fill = np.asarray(numerical_fill, dtype=np.float64)
+        self.numerical_mean = np.asarray(numerical_mean, dtype=np.float64)
+        self.numerical_scale = np.asarray(numerical_scale, dtype=np.float64)
+        self.iteration_range = tuple(iteration_range)
+        self.threshold = threshold
+        # Set by get_scorer: version of the model artifact, 'compact' or 'pickle', load and warm-up times
+        self.version = None
+        self.source = None
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+
+        # Position of every category in the one-hot block, followed by the scaled numerical block
+        self.offsets = np.cumsum([0] + [len(values) for values in self.categories])
+        self.lookups = [{value: offset + i for i, value in enumerate(values)}
+                        for offset, values in zip(self.offsets, self.categories)]
+        self.fill_positions = [lookup[value] for lookup, value in zip(self.lookups, self.categorical_fill)]
+        self.n_categorical = int(self.offsets[-1])
+        self.n_features = self.n_categorical + len(self.numerical_columns)
+
+    # Method to get the names of the model features (one-hot columns named like OneHotEncoder.get_feature_names_out)
+    def feature_names(self):
+        names = [f"{column}_{category}" for column, categories in zip(self.categorical_columns, self.categories)
+                 for category in categories]
+        return names + self.numerical_columns
+
+    # Method to compile the scorer from a fitted Pipeline(preprocessor=ColumnTransformer, classifier=XGBClassifier)
+    @classmethod
+    def from_pipeline(cls, model):
+        preprocessor = model.named_steps['preprocessor']
+        classifier = model.named_steps['classifier']
+        (_, cat_pipeline, cat_columns), (_, num_pipeline, num_columns) = [
+            transformer for transformer in preprocessor.transformers_ if transformer[0] != 'remainder']
+
+        cat_imputer, ohe = cat_pipeline.named_steps['imputer'], cat_pipeline.named_steps['ohe']
+        num_imputer, scaler = num_pipeline.named_steps['imputer'], num_pipeline.named_steps['scaler']
+        if ohe.drop is not None or cat_imputer.strategy != 'most_frequent':
+            raise ValueError("Only one-hot encoding without dropped categories is supported")
+
+        n_numerical = len(num_columns)
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n_numerical)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n_numerical)
+
+        best_iteration = getattr(classifier, 'best_iteration', None)
+        iteration_range = (0, best_iteration + 1) if best_iteration is not None else (0, 0)
+        return cls(classifier.get_booster(), cat_columns, ohe.categories_, cat_imputer.statistics_,
+                   num_columns, num_imputer.statistics_, mean, scale, iteration_range)
+
+    # Method to turn a DataFrame with the 19 input fields into the model's feature matrix
+    def transform(self, df):
+        with timer('preprocess'):
+            return self._transform(df)
+
+    def _transform(self, df):
+        n_rows = len(df)
+        features = np.zeros((n_rows, self.n_features), dtype=np.float64)
+        rows = np.arange(n_rows)
+
+        for column, values, offset, fill in zip(self.categorical_columns, self.categories, self.offsets,
+                                                self.fill_positions):
+            raw = df[column]
+            codes = pd.Categorical(raw, categories=values).codes.astype(np.intp) + offset
+            missing = raw.isna().to_numpy()
+            unknown = (codes < offset) & ~missing
+            if unknown.any():
+                raise ValueError(f"Found unknown categories {sorted(set(raw[unknown]))} in column '{column}'")
+            codes[missing] = fill
+            features[rows, codes] = 1.0
+
+        numerical = df[self.numerical_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        numerical = np.where(np.isnan(numerical), self.numerical_fill, numerical)
+        features[:, self.n_categorical:] = (numerical - self.numerical_mean) / self.numerical_scale
+        return features.astype(np.float32)
+
+    # Method to turn a single record (dict with the 19 input fields) into the model's feature vector
+    def encode_record(self, record):
+        features = np.zeros(self.n_features, dtype=np.float64)
+        for column, lookup, fill in zip(self.categorical_columns, self.lookups, self.fill_positions):
+            value = record[column]
+            if value is None or value != value:
+                features[fill] = 1.0
+            elif value in lookup:
+                features[lookup[value]] = 1.0
+            else:
+                raise ValueError(f"Found unknown category '{value}' in column '{column}'")
+
+        numerical = np.array([record[column] for column in self.numerical_columns], dtype=np.float64)
+        numerical = np.where(np.isnan(numerical), self.numerical_fill, numerical)
+        features[self.n_categorical:] = (numerical - self.numerical_mean) / self.numerical_scale
+        return features.astype(np.float32)
+
+    # Method to get the probability of class 1 ('Dissatisfied') for an already transformed feature matrix
+    def predict_proba_features(self, features):
+        if not len(features):
+            return np.empty(0, dtype=np.float32)
+        count(ROWS_SCORED_METRIC, len(features))
+        with timer('predict'):
+            return self.booster.inplace_predict(features, iteration_range=self.iteration_range)
+
+    def predict_proba(self, df):
+        return self.predict_proba_features(self.transform(df))
+
+    def predict(self, df):
+        return (self.predict_proba(df) > self.threshold).astype(np.int64)
+
+    # Method to score one record, returns the predicted class and the probability of 'Dissatisfied'
+    def predict_record(self, record):
+        count(ROWS_SCORED_METRIC)
+        with timer('predict_record'):
+            features = self.encode_record(record)[np.newaxis, :]
+            probability = float(self.row_booster.inplace_predict(features, iteration_range=self.iteration_range)[0])
+        return int(probability > self.threshold), probability
+
+
+_lock = threading.Lock()
+_scorers = {}
+
+
+# Method to build the scorer of a model artifact, from its compact export (see compact_model.py) when the export
+# was made from the current version of the artifact, otherwise compiled from the unpickled pipeline
+def _build_scorer(path, version):
+    from utils.compact_model import compact_spec_path, load_compact, spec_version
+
+    spec_path = compact_spec_path(path)
+    if spec_version(spec_path) == version:
+        start = time.perf_counter()
+        with timer('compact_load'):
+            scorer = load_compact(spec_path)
+        scorer.source, scorer.load_seconds = 'compact', time.perf_counter() - start
+        start = time.perf_counter()
+        with timer('model_warmup'):
+            scorer.row_booster.inplace_predict(scorer.encode_record(WARMUP_RECORD)[np.newaxis, :],
+                                               iteration_range=scorer.iteration_range)
+        scorer.warmup_seconds = time.perf_counter() - start
+    else:
+        entry = get_entry(path)
+        scorer = CompiledScorer.from_pipeline(entry.model)
+        scorer.source, scorer.load_seconds, scorer.warmup_seconds = 'pickle', entry.load_seconds, entry.warmup_seconds
+    scorer.version = version
+    return scorer
+
+
+# Method to get the compiled scorer of a model artifact, rebuilt whenever the content of the artifact changes
+def get_scorer(path=MODEL_PATH):
+    path = os.path.abspath(path)
+    version = artifact_version(path)
+    cached = _scorers.get(path)
+    if cached is not None and cached.version == version:
+        return cached
+
+    with _lock:
+        cached = _scorers.get(path)
+        if cached is None or cached.version != version:
+            cached = _build_scorer(path, version)
+            _scorers[path] = cached
+        return cached
+
+
+# Method to compare the compiled scorer against the pipeline, returns the number of differing predictions
+def check_parity(model, scorer, df):
+    expected = model.predict(df[FEATURE_COLUMNS])
+    expected_proba = model.predict_proba(df[FEATURE_COLUMNS])[:, 1]
+    predicted = scorer.predict(df[FEATURE_COLUMNS])
+    predicted_proba = scorer.predict_proba(df[FEATURE_COLUMNS])
+    if not np.array_equal(expected_proba, predicted_proba):
+        print(f"Max probability difference: {np.abs(expected_proba - predicted_proba).max():.3g}")
+    return int((expected != predicted).sum())
+
+
+if __name__ == "__main__":
+    from utils.data_store import load_dataset
+
+    df = load_dataset()
+    model = get_entry().model
+    scorer = get_scorer()
+
+    mismatches = check_parity(model, scorer, df)
+    print(f"Parity on {len(df)} rows: {mismatches} differing predictions")
+
+    records = df[FEATURE_COLUMNS].head(1000).to_dict(orient='records')
+    for label, predict in [('pipeline', lambda record: model.predict(pd.DataFrame([record]))),
+                           ('compiled', scorer.predict_record)]:
+        start = time.perf_counter()
+        for record in records:
+            predict(record)
+        elapsed = (time.perf_counter() - start) / len(records)
+        print(f"{label:>8}: {elapsed * 1e6:.1f} us per row")
+
+    label, probability = scorer.predict_record(records[0])
+    print(f"First row: {LABELS[label]} (p(Dissatisfied) = {probability:.4f})")
@@ -0,0 +1,287 @@
+# instrumentation.py
+# Lightweight timing instrumentation and metrics export for the dashboard.
+#
+# Hot spots are wrapped in `timer(operation)`, which records the duration in a latency histogram labelled with
+# the operation and the page being rendered (and counts failures), and writes a structured JSON log line when
+# JSON logging is enabled. The metrics of the process are exposed in Prometheus text format on a local HTTP
+# endpoint (GET /metrics, or /metrics.json for a JSON snapshot). Pages are run through `run_page`, which times
+# the whole rerun, counts page views and offers an opt-in cProfile profiler in the sidebar.
+#
+# Configuration through environment variables:
+#     DASHBOARD_METRICS_PORT  port of the metrics endpoint on 127.0.0.1 (default 9464, 0 disables it)
+#     DASHBOARD_JSON_LOG      '-' to write JSON logs to stderr, or the path of a log file (default: disabled)
+import bisect
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DURATION_METRIC = 'dashboard_operation_duration_seconds'
+ERRORS_METRIC = 'dashboard_operation_errors_total'
+PAGE_VIEWS_METRIC = 'dashboard_page_views_total'
+ROWS_SCORED_METRIC = 'dashboard_rows_scored_total'
+PREDICTION_CACHE_METRIC = 'dashboard_prediction_cache_total'
+
+BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_METRICS_PORT = 9464
+PROFILE_LINES = 30
+
+HELP = {
+    DURATION_METRIC: 'Duration of instrumented dashboard operations',
+    ERRORS_METRIC: 'Number of instrumented operations which raised an exception',
+    PAGE_VIEWS_METRIC: 'Number of page reruns',
+    ROWS_SCORED_METRIC: 'Number of rows scored by the model',
+    PREDICTION_CACHE_METRIC: 'Number of predictions served from the prediction cache (hit) or the model (miss)',
+}
+
+logger = logging.getLogger('dashboard.metrics')
+logger.propagate = False
+
+# Page currently rendered by this thread (Streamlit runs every session's script in its own thread)
+_current_page = contextvars.ContextVar('dashboard_page', default='')
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, labels=None):
+        key = self._key(name, labels or {})
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # Method to get all metrics as a JSON-serialisable dict
+    def snapshot(self):
+        with self._lock:
+            histograms = [{'name': name, 'labels': dict(labels), 'count': histogram.count, 'sum': histogram.sum,
+                           'buckets': dict(zip([str(bound) for bound in histogram.buckets] + ['+Inf'],
+                                               _cumulative(histogram.counts)))}
+                          for (name, labels), histogram in self._histograms.items()]
+            counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                        for (name, labels), value in self._counters.items()]
+        return {'histograms': histograms, 'counters': counters}
+
+    # Method to render all metrics in the Prometheus text exposition format
+    def render_prometheus(self):
+        with self._lock:
+            histograms = sorted((key, list(histogram.counts), histogram.sum, histogram.count, histogram.buckets)
+                                for key, histogram in self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        lines = []
+        for kind, metrics in [('histogram', histograms), ('counter', counters)]:
+            seen = set()
+            for metric in metrics:
+                (name, labels) = metric[0]
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                    lines.append(f"# TYPE {name} {kind}")
+                if kind == 'counter':
+                    lines.append(f"{name}{_format_labels(labels)} {metric[1]}")
+                    continue
+                _, counts, total, count, buckets = metric
+                for bound, cumulative in zip(list(buckets) + ['+Inf'], _cumulative(counts)):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+def _cumulative(counts):
+    total, result = 0, []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in labels]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+REGISTRY = MetricsRegistry()
+
+
+# Method to time a block of code, e.g. `with timer('csv_parse'):`. Extra labels are added to the metric.
+@contextmanager
+def timer(operation, **labels):
+    labels = {'operation': operation, 'page': _current_page.get(), **labels}
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        REGISTRY.observe(DURATION_METRIC, seconds, labels)
+        if failed:
+            REGISTRY.inc(ERRORS_METRIC, 1, labels)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('operation', extra={'fields': {**labels, 'seconds': round(seconds, 6), 'failed': failed}})
+
+
+# Method to increase a counter, e.g. the number of scored rows
+def count(name, amount=1, **labels):
+    REGISTRY.inc(name, amount, labels)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+                 'level': record.levelname, 'logger': record.name, 'event': record.getMessage()}
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry)
+
+
+# Method to write the operation logs as JSON lines to stderr ('-') or a file
+def configure_json_logging(destination):
+    handler = logging.StreamHandler(sys.stderr) if destination == '-' else logging.FileHandler(destination)
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return handler
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = REGISTRY.render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(REGISTRY.snapshot()), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_lock = threading.Lock()
+_server = None
+_configured = False
+
+
+# Method to serve the metrics on 127.0.0.1:port in a background thread, returns the server (None if the port is
+# already in use, e.g. by another dashboard process)
+def start_metrics_server(port=DEFAULT_METRICS_PORT, host='127.0.0.1'):
+    global _server
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            except OSError as exc:
+                logging.getLogger(__name__).warning("Metrics endpoint not started on port %s: %s", port, exc)
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name='metrics-server', daemon=True).start()
+        return _server
+
+
+# Method to start the metrics endpoint and JSON logging as configured by the environment, once per process
+def configure_from_environment():
+    global _configured
+    if _configured:
+        return
+    with _lock:
+        if _configured:
+            return
+        _configured = True
+        destination = os.environ.get('DASHBOARD_JSON_LOG')
+    if destination:
+        configure_json_logging(destination)
+    port = int(os.environ.get('DASHBOARD_METRICS_PORT', DEFAULT_METRICS_PORT))
+    if port:
+        start_metrics_server(port)
+
+
+# Method to profile a function call, returns its result and the cProfile statistics as text
+def profile_call(function, lines=PROFILE_LINES):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        result = function()
+    finally:
+        profiler.disable()
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(lines)
+    return result, output.getvalue()
+
+
+# Method to render a page with timing, page view counting and the optional profiler of the sidebar
+def run_page(page, show_page):
+    import streamlit as st
+
+    configure_from_environment()
+    token = _current_page.set(page)
+    try:
+        count(PAGE_VIEWS_METRIC, page=page)
+        profile = st.sidebar.toggle("Profile this rerun", key=f"profile_{page}",
+                                    help="Runs the page under cProfile and shows the slowest calls below")
+        if not profile:
+            with timer('render'):
+                show_page()
+            return
+
+        profile_text = None
+        try:
+            with timer('render', profiled='true'):
+                _, profile_text = profile_call(show_page)
+        finally:
+            if profile_text is not None:
+                with st.sidebar.expander("Profile (cumulative time)", expanded=True):
+                    st.code(profile_text, language=None)
+    finally:
+        _current_page.reset(token)
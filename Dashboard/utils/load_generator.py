@@ -0,0 +1,155 @@
+# load_generator.py
+# Load generator for the scoring server (utils/scoring_server.py).
+#
+# For every batch window given with --windows a scoring server is started as a subprocess, a fixed number of
+# concurrent clients send single-record requests over keep-alive connections for --duration seconds, and the
+# p50/p99 latency and the throughput are reported. Use --url to measure an already running server instead.
+#
+#     python -m utils.load_generator --windows 0,1,2,5,10 --concurrency 64 --duration 10
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from utils.model_registry import WARMUP_RECORD
+from utils.schema import FEATURE_COLUMNS
+
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Method to get the request bodies sent by the clients (rows of the dataset if available)
+def load_bodies(n_records=1000):
+    try:
+        from utils.data_store import load_dataset
+        df = load_dataset()[FEATURE_COLUMNS].head(n_records)
+        records = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+    except FileNotFoundError:
+        records = [WARMUP_RECORD]
+    return [json.dumps(record, default=lambda value: value.item()).encode() for record in records]
+
+
+async def client(host, port, bodies, offset, stop_at, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = offset
+    try:
+        while time.perf_counter() < stop_at:
+            body = bodies[i % len(bodies)]
+            i += 1
+            start = time.perf_counter()
+            writer.write(b"POST /predict HTTP/1.1\r\nHost: " + host.encode() +
+                         b"\r\nContent-Type: application/json\r\nContent-Length: " + str(len(body)).encode() +
+                         b"\r\n\r\n" + body)
+            await writer.drain()
+
+            status = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            if b' 200 ' not in status:
+                raise RuntimeError(f"Request failed: {status.decode().strip()}")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, bodies, concurrency, duration):
+    latencies = []
+    start = time.perf_counter()
+    stop_at = start + duration
+    await asyncio.gather(*[client(host, port, bodies, i * 7, stop_at, latencies) for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99))
+    }
+
+
+async def fetch_health(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+
+# Method to start a scoring server subprocess and wait until it answers
+def start_server(port, batch_window_ms, max_batch_size, timeout=60):
+    process = subprocess.Popen([sys.executable, '-m', 'utils.scoring_server', '--port', str(port),
+                                '--batch-window-ms', str(batch_window_ms), '--max-batch-size', str(max_batch_size)],
+                               cwd=DASHBOARD_DIR, stdout=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Scoring server exited during startup")
+        try:
+            asyncio.run(fetch_health('127.0.0.1', port))
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Scoring server did not start in time")
+
+
+def print_row(window, result, health):
+    print(f"{window:>10} {result['requests']:>9} {result['throughput_rps']:>12.0f} "
+          f"{result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {health['mean_batch_size']:>15.1f}", flush=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure latency and throughput of the scoring server")
+    parser.add_argument('--url', help="Measure an already running server instead of starting one per window")
+    parser.add_argument('--windows', default='0,1,2,5,10', help="Comma-separated batch windows in milliseconds")
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds of load per batch window")
+    parser.add_argument('--port', type=int, default=8799, help="Port for the servers started by this script")
+    parser.add_argument('--output', help="Optional JSON file for the results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    bodies = load_bodies()
+    results = []
+
+    print(f"{'window_ms':>10} {'requests':>9} {'throughput/s':>12} {'p50_ms':>9} {'p99_ms':>9} {'mean_batch_size':>15}")
+    if args.url:
+        url = urlparse(args.url)
+        result = asyncio.run(run_load(url.hostname, url.port, bodies, args.concurrency, args.duration))
+        health = asyncio.run(fetch_health(url.hostname, url.port))
+        print_row(health['batch_window_ms'], result, health)
+        results.append(dict(result, batch_window_ms=health['batch_window_ms']))
+    else:
+        for window in [float(value) for value in args.windows.split(',')]:
+            process = start_server(args.port, window, args.max_batch_size)
+            try:
+                result = asyncio.run(run_load('127.0.0.1', args.port, bodies, args.concurrency, args.duration))
+                health = asyncio.run(fetch_health('127.0.0.1', args.port))
+            finally:
+                process.terminate()
+                process.wait()
+            print_row(window, result, health)
+            results.append(dict(result, batch_window_ms=window, mean_batch_size=health['mean_batch_size']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'concurrency': args.concurrency, 'duration': args.duration, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+# model_registry.py
+# Process-wide registry of the trained model pipelines.
+#
+# Every pipeline is unpickled once per process and shared by all pages and sessions. Before a cached
+# pipeline is handed out, the artifact's mtime and size are checked; if they changed, the file is hashed
+# and the pipeline is only reloaded when the content hash differs. A warm-up prediction is run right after
+# loading so that the first real request does not pay for lazy initialisation inside XGBoost.
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import joblib
+import pandas as pd
+
+from utils.instrumentation import timer
+from utils.schema import FEATURE_COLUMNS
+
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(DASHBOARD_DIR, 'pages', 'xgboost.pkl')
+
+# Customer used for the warm-up prediction (first row of the batch prediction template)
+WARMUP_RECORD = {
+    'Customer Type': 'Loyal Customer',
+    'Class': 'Eco',
+    'Type of Travel': 'Business travel',
+    'Age': 35,
+    'Flight Distance': 500,
+    'Seat comfort': 3,
+    'Food and drink': 4,
+    'Inflight wifi service': 2,
+    'Inflight entertainment': 4,
+    'Online support': 3,
+    'Ease of Online booking': 4,
+    'On-board service': 4,
+    'Leg room service': 3,
+    'Baggage handling': 4,
+    'Checkin service': 4,
+    'Cleanliness': 5,
+    'Online boarding': 4,
+    'Departure Delay in Minutes': 10,
+    'Arrival Delay in Minutes': 15
+}
+
+
+@dataclass
+class ModelEntry:
+    path: str
+    model: object = field(repr=False)
+    version: str
+    loaded_at: float
+    load_seconds: float
+    warmup_seconds: float
+    mtime_ns: int = field(repr=False)
+    size: int = field(repr=False)
+
+
+_lock = threading.Lock()
+_entries = {}
+_versions = {}
+
+
+# Method to compute the content hash of a model artifact, used as its version
+def file_version(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+# Method to run one prediction so that lazy initialisation happens before the first real request
+def warm_up(model):
+    start = time.perf_counter()
+    with timer('model_warmup'):
+        model.predict(pd.DataFrame([WARMUP_RECORD], columns=FEATURE_COLUMNS))
+    return time.perf_counter() - start
+
+
+def _load(path, stat, version):
+    start = time.perf_counter()
+    with timer('model_load'):
+        model = joblib.load(path)
+    load_seconds = time.perf_counter() - start
+    warmup_seconds = warm_up(model)
+    return ModelEntry(path=path, model=model, version=version, loaded_at=time.time(),
+                      load_seconds=load_seconds, warmup_seconds=warmup_seconds,
+                      mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+
+# Method to get the registry entry (pipeline plus load statistics) of a model artifact
+def get_entry(path=MODEL_PATH):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    entry = _entries.get(path)
+    if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+        return entry
+
+    with _lock:
+        entry = _entries.get(path)
+        if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+            return entry
+
+        with timer('model_hash'):
+            version = file_version(path)
+        if entry is not None and entry.version == version:
+            # The file was touched or copied but its content is unchanged
+            entry.mtime_ns, entry.size = stat.st_mtime_ns, stat.st_size
+            return entry
+
+        entry = _load(path, stat, version)
+        _entries[path] = entry
+        return entry
+
+
+# Method to get the version of a model artifact without loading it (hashed again only when the file changes)
+def artifact_version(path=MODEL_PATH):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    entry = _entries.get(path)
+    if entry is not None and (entry.mtime_ns, entry.size) == (stat.st_mtime_ns, stat.st_size):
+        return entry.version
+    cached = _versions.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    with timer('model_hash'):
+        version = file_version(path)
+    _versions[path] = (stat.st_mtime_ns, stat.st_size, version)
+    return version
+
+
+# Method to get the shared pipeline of a model artifact
+def get_model(path=MODEL_PATH):
+    return get_entry(path).model
+
+
+# Method to list all models loaded in this process (e.g. for display or monitoring)
+def loaded_entries():
+    return list(_entries.values())
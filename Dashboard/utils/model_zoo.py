@@ -0,0 +1,235 @@
+# model_zoo.py
+# Scoring engine for several model pipelines at once (the model zoo of the README).
+#
+# Every model is a pipeline stored as pages/<name>.pkl with the same structure as the shipped XGBoost model:
+# Pipeline(preprocessor=ColumnTransformer, classifier=...). The engine groups the pipelines by the content hash of
+# their fitted preprocessor, so that the ColumnTransformer runs once per batch for all models which share it
+# (train_model reuses the preprocessor of the shipped model for the other classifiers). The classifiers are then
+# scored concurrently on the transformed matrix and their probabilities are combined into an ensemble (mean
+# probability of 'Dissatisfied'). The time spent in every model is recorded, so that the latency and throughput of
+# the models can be compared with their accuracy. XGBoost uses every core by default, so the engine scores its own
+# copies of the XGBoost classifiers, limited to their share of the cores when the models run concurrently.
+#
+# Command line usage from the Dashboard directory:
+#     python -m utils.model_zoo --min-auc 0.95     # accuracy, latency and throughput of every available model
+import argparse
+import copy
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from utils.instrumentation import timer
+from utils.model_registry import DASHBOARD_DIR, get_entry
+from utils.schema import FEATURE_COLUMNS, LABELS
+
+# Models of the README which can be trained with `python -m utils.train_model --classifier <name>`
+MODEL_NAMES = {
+    'xgboost': 'XGBoost',
+    'decision_tree': 'Decision Tree',
+    'logistic_regression': 'Logistic Regression',
+    'mlp': 'Neural Network (MLP)',
+    'svc': 'Support Vector Classifier',
+}
+# The model served by the dashboard, the others are scored in addition to it
+PRIMARY_MODEL = 'xgboost'
+ENSEMBLE_NAME = 'Ensemble'
+# Number of records timed one by one for the single-row latency
+LATENCY_RECORDS = 200
+
+
+# Method to get the location of the artifact of a model
+def model_path(name):
+    return os.path.join(DASHBOARD_DIR, 'pages', f"{name}.pkl")
+
+
+# Method to list the models for which an artifact exists
+def available_models():
+    return [name for name in MODEL_NAMES if os.path.exists(model_path(name))]
+
+
+# Method to get the number of threads of every model so that the models scored at the same time use each core once
+def threads_per_model(concurrent):
+    return max(1, (os.cpu_count() or 1) // concurrent)
+
+
+_lock = threading.Lock()
+_preprocessor_keys = {}
+_engines = {}
+
+
+# Method to get the content hash of the fitted preprocessor of a registry entry (computed once per model version)
+def preprocessor_key(entry):
+    key = _preprocessor_keys.get((entry.path, entry.version))
+    if key is None:
+        key = joblib.hash(entry.model.named_steps['preprocessor'])
+        _preprocessor_keys[(entry.path, entry.version)] = key
+    return key
+
+
+@dataclass
+class ZooPrediction:
+    # Probability of 'Dissatisfied' per model (one column per model and the ensemble if there are several models)
+    probabilities: pd.DataFrame
+    # Seconds spent in every model and in the preprocessors for this batch
+    model_seconds: dict = field(default_factory=dict)
+    preprocess_seconds: float = 0.0
+
+    def predictions(self, threshold=0.5):
+        return self.probabilities.apply(lambda column: pd.Series(
+            np.asarray(LABELS, dtype=object)[(column.to_numpy() > threshold).astype(np.int64)], index=column.index))
+
+
+class ModelEngine:
+    def __init__(self, names, workers=None):
+        self.names = list(names)
+        self.entries = {name: get_entry(model_path(name)) for name in self.names}
+        self.versions = tuple(entry.version for entry in self.entries.values())
+        self.workers = workers or len(self.names)
+        self.threads = threads_per_model(min(self.workers, len(self.names)))
+        self.classifiers = {}
+        for name, entry in self.entries.items():
+            classifier = entry.model.named_steps['classifier']
+            if hasattr(classifier, 'get_booster'):
+                # The pipeline is shared with other engines and sessions, only the copy gets the thread limit
+                classifier = copy.deepcopy(classifier).set_params(n_jobs=self.threads)
+            self.classifiers[name] = classifier
+
+        # Models which share a fitted preprocessor are scored on the same transformed matrix
+        self.groups = {}
+        for name, entry in self.entries.items():
+            key = preprocessor_key(entry)
+            if key not in self.groups:
+                self.groups[key] = (entry.model.named_steps['preprocessor'], [])
+            self.groups[key][1].append(name)
+
+    def _predict(self, name, features):
+        classifier = self.classifiers[name]
+        start = time.perf_counter()
+        with timer('zoo_predict', model=name):
+            probabilities = classifier.predict_proba(features)[:, 1]
+        return probabilities, time.perf_counter() - start
+
+    # Method to score a DataFrame with the 19 input fields with all models of the engine
+    def score(self, df):
+        df = df[FEATURE_COLUMNS]
+        start = time.perf_counter()
+        tasks = []
+        with timer('zoo_preprocess', groups=str(len(self.groups))):
+            for preprocessor, names in self.groups.values():
+                features = preprocessor.transform(df)
+                tasks.extend((name, features) for name in names)
+        preprocess_seconds = time.perf_counter() - start
+
+        if self.workers > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(lambda task: self._predict(*task), tasks))
+        else:
+            results = [self._predict(*task) for task in tasks]
+
+        results = dict(zip([name for name, _ in tasks], results))
+        probabilities = pd.DataFrame({MODEL_NAMES[name]: results[name][0] for name in self.names}, index=df.index)
+        if len(self.names) > 1:
+            probabilities[ENSEMBLE_NAME] = probabilities.mean(axis=1)
+        return ZooPrediction(probabilities, {name: results[name][1] for name in self.names}, preprocess_seconds)
+
+    # Method to score one record (dict with the 19 input fields)
+    def score_record(self, record):
+        return self.score(pd.DataFrame([record], columns=FEATURE_COLUMNS))
+
+
+# Method to get the engine for a set of models, re-created when one of the models changes
+def get_engine(names):
+    names = tuple(names)
+    versions = tuple(get_entry(model_path(name)).version for name in names)
+    cached = _engines.get(names)
+    if cached is not None and cached.versions == versions:
+        return cached
+
+    with _lock:
+        cached = _engines.get(names)
+        if cached is None or cached.versions != versions:
+            cached = ModelEngine(names)
+            _engines[names] = cached
+        return cached
+
+
+# Method to compare the models on labelled data: validation AUC and accuracy, latency of single records and
+# throughput of the whole batch
+def evaluate_models(engine, df, latency_records=LATENCY_RECORDS):
+    from sklearn.metrics import accuracy_score, roc_auc_score
+
+    y_true = (df['satisfaction'] == 'dissatisfied').to_numpy(dtype=np.int32)
+    prediction = engine.score(df)
+    rows = []
+    for name in engine.names + ([ENSEMBLE_NAME] if len(engine.names) > 1 else []):
+        column = MODEL_NAMES.get(name, name)
+        probabilities = prediction.probabilities[column].to_numpy()
+        seconds = sum(prediction.model_seconds.values()) if name == ENSEMBLE_NAME else prediction.model_seconds[name]
+        rows.append({'Model': column, 'AUC': roc_auc_score(y_true, probabilities),
+                     'Accuracy': accuracy_score(y_true, probabilities > 0.5),
+                     'Rows/s': len(df) / seconds if seconds else float('nan')})
+
+    # Single records go through the preprocessor and the classifier of one model at a time
+    records = df[FEATURE_COLUMNS].head(latency_records).to_dict(orient='records')
+    for row, name in zip(rows, engine.names):
+        single = ModelEngine([name], workers=1)
+        start = time.perf_counter()
+        for record in records:
+            single.score_record(record)
+        row['Latency (ms)'] = (time.perf_counter() - start) / len(records) * 1000
+    if len(engine.names) > 1:
+        start = time.perf_counter()
+        for record in records:
+            engine.score_record(record)
+        rows[-1]['Latency (ms)'] = (time.perf_counter() - start) / len(records) * 1000
+    return pd.DataFrame(rows)
+
+
+# Method to choose the model with the highest throughput among the models which reach the AUC bar
+def cheapest_model(evaluation, min_auc):
+    candidates = evaluation[evaluation['AUC'] >= min_auc]
+    if candidates.empty:
+        return None
+    return candidates.sort_values(['Rows/s', 'Latency (ms)'], ascending=[False, True]).iloc[0]['Model']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the accuracy and cost of the available models")
+    parser.add_argument('--models', help="Comma-separated model names (default: all available models)")
+    parser.add_argument('--data', help="Labelled CSV (default: the validation split of the dataset)")
+    parser.add_argument('--min-auc', type=float, default=0.95, help="Accuracy bar for the model recommendation")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from utils.data_store import load_dataset
+
+    args = parse_args(argv)
+    names = args.models.split(',') if args.models else available_models()
+    engine = ModelEngine(names)
+    if args.data:
+        df = load_dataset(args.data)
+    else:
+        from sklearn.model_selection import train_test_split
+        from utils.train_model import RANDOM_STATE, VALIDATION_FRACTION, labels
+
+        df = load_dataset()
+        _, df = train_test_split(df, test_size=VALIDATION_FRACTION, stratify=labels(df), random_state=RANDOM_STATE)
+
+    print(f"{len(names)} models, {len(engine.groups)} distinct preprocessors, {len(df)} rows")
+    evaluation = evaluate_models(engine, df)
+    with pd.option_context('display.width', 200):
+        print(evaluation.round(4).to_string(index=False))
+    choice = cheapest_model(evaluation, args.min_auc)
+    print(f"Cheapest model with AUC >= {args.min_auc}: {choice}" if choice else
+          f"No model reaches an AUC of {args.min_auc}")
+
+
+if __name__ == "__main__":
+    main()
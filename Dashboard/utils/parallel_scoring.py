@@ -0,0 +1,199 @@
+# parallel_scoring.py
+# Multi-core batch scoring with a pool of worker processes.
+#
+# Every worker loads the model once and scores whole chunks with XGBoost limited to cpu_count // workers
+# threads, so that the workers do not oversubscribe the machine. Chunks are handed out in order and results are
+# returned in input order, with at most two chunks per worker in flight to keep memory bounded. The output is
+# byte-identical to the serial path in batch_scoring.
+#
+# Command line usage from the Dashboard directory (a file or a directory of xlsx/csv/parquet files):
+#     python -m utils.parallel_scoring surveys/ --output-dir predictions/ --workers 1,2,4
+# Every worker count is run in turn on a pool of exactly that size and the rows/second are reported.
+import argparse
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.batch_scoring import CHUNK_SIZE, INPUT_FORMATS, score_chunk, score_file
+from utils.counterfactuals import get_search
+from utils.fast_scorer import get_scorer
+from utils.model_registry import MODEL_PATH, artifact_version
+
+_worker_scorer = None
+_worker_search = None
+_lock = threading.Lock()
+# Pools by (workers, model path, model version), the number of running parallel_map calls on each of them and the
+# key of the most recently requested pool
+_pools = {}
+_users = {}
+_current_key = None
+
+
+# Method to get the number of XGBoost threads per worker so that all workers together use each core once
+def threads_per_worker(workers):
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _init_worker(model_path, nthread):
+    global _worker_scorer, _worker_search
+    _worker_scorer = get_scorer(model_path)
+    _worker_scorer.booster.set_param({'nthread': nthread})
+    _worker_search = get_search(model_path)
+
+
+def _score_in_worker(chunk, recommendations, counterfactuals, models):
+    return score_chunk(chunk, _worker_scorer, recommendations, counterfactuals, _worker_search, models)
+
+
+def _worker_ready():
+    # Keep the worker busy for a moment so that every warm-up task starts its own worker process
+    time.sleep(0.1)
+    return os.getpid()
+
+
+# Method to take a process pool with exactly the given number of workers for the current version of the model,
+# returns its key (for release_pool) and the pool. A pool is only shut down once nobody uses it any more and a pool
+# for another worker count or model version was requested since, so a running batch is never cut off and at most
+# the most recently requested pool stays alive while idle (the workers load the model once, so a pool started for
+# an older version would keep scoring with the old model).
+def acquire_pool(workers, model_path=MODEL_PATH):
+    global _current_key
+    model_path = os.path.abspath(model_path)
+    key = (workers, model_path, artifact_version(model_path))
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # Use spawn, forking a process which runs the Streamlit server threads is not safe
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker, initargs=(model_path, threads_per_worker(workers)))
+            _pools[key] = pool
+        _users[key] = _users.get(key, 0) + 1
+        _current_key = key
+        _shutdown_idle()
+        return key, pool
+
+
+def release_pool(key):
+    with _lock:
+        _users[key] -= 1
+        _shutdown_idle()
+
+
+# Method to shut down the pools which are neither used nor the most recently requested one (called with the lock)
+def _shutdown_idle():
+    for key in [key for key in _pools if key != _current_key and not _users.get(key)]:
+        _pools.pop(key).shutdown(wait=False)
+        _users.pop(key, None)
+
+
+# Method to score a sequence of chunks on the process pool, yields the scored chunks in input order
+def parallel_map(chunks, workers, model_path=MODEL_PATH, recommendations=False, counterfactuals=False, models=()):
+    key, pool = acquire_pool(workers, model_path)
+    try:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_score_in_worker, chunk, recommendations, counterfactuals, models))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        release_pool(key)
+
+
+# Method to start all workers of a pool and load the model in each of them
+def warm_up_pool(workers, model_path=MODEL_PATH):
+    key, pool = acquire_pool(workers, model_path)
+    try:
+        return {future.result() for future in [pool.submit(_worker_ready) for _ in range(workers)]}
+    finally:
+        release_pool(key)
+
+
+def shutdown_pools():
+    global _current_key
+    with _lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
+        _users.clear()
+        _current_key = None
+
+
+# Method to collect the input files from a list of files and directories
+def collect_inputs(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if os.path.splitext(name)[1].lower().lstrip('.') in INPUT_FORMATS))
+        else:
+            files.append(path)
+    return files
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Method to score all input files with the given number of workers, returns (rows, seconds, output digests)
+def run(files, output_dir, workers, output_format='csv', chunk_size=CHUNK_SIZE):
+    if workers > 1:
+        # Start the workers and load the model before the clock starts
+        warm_up_pool(workers)
+    else:
+        get_scorer()
+
+    rows = 0
+    digests = []
+    start = time.perf_counter()
+    for path in files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        output_path = os.path.join(output_dir, f"predictions_{name}.{output_format}")
+        with open(path, 'rb') as source:
+            result = score_file(source, path, output_path, output_format, chunk_size, workers=workers)
+        rows += result.total_rows
+        digests.append(file_digest(output_path))
+    return rows, time.perf_counter() - start, digests
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score survey files in parallel and report throughput")
+    parser.add_argument('inputs', nargs='+', help="Input files or directories (xlsx, csv or parquet)")
+    parser.add_argument('--output-dir', default='predictions')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--workers', default=str(os.cpu_count() or 1),
+                        help="Comma-separated worker counts, e.g. 1,2,4 (1 is the serial in-process path)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    files = collect_inputs(args.inputs)
+    if not files:
+        raise SystemExit("No input files found")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    reference = None
+    print(f"{'workers':>7} {'threads':>7} {'rows':>10} {'seconds':>8} {'rows/s':>10} {'identical':>9}")
+    try:
+        for workers in [int(value) for value in args.workers.split(',')]:
+            rows, seconds, digests = run(files, args.output_dir, workers, args.format, args.chunk_size)
+            reference = reference or digests
+            print(f"{workers:>7} {threads_per_worker(workers):>7} {rows:>10} {seconds:>8.2f} {rows / seconds:>10.0f} "
+                  f"{str(digests == reference):>9}", flush=True)
+    finally:
+        shutdown_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# prediction_cache.py
+# Reuse of predictions for repeated survey inputs.
+#
+# The inputs are highly discrete (three categoricals and twelve 0-5 ratings), so the same customer profile is
+# scored again and again: on repeated clicks of "Predict" and many times within an uploaded file. Single records
+# go through a bounded LRU cache keyed on the normalised 19 input fields; a cache belongs to one model version and
+# is replaced when the registry reloads the model. Batches are deduplicated on the model's feature vectors, every
+# unique row is scored once and the results are scattered back to the duplicates. Hits and misses of both are
+# counted in the instrumentation registry (dashboard_prediction_cache_total{cache=..., result=...}).
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.fast_scorer import get_scorer
+from utils.instrumentation import PREDICTION_CACHE_METRIC, count, timer
+from utils.model_registry import MODEL_PATH, artifact_version
+from utils.schema import CATEGORICAL_FEATURES, FEATURE_COLUMNS
+
+CACHE_SIZE = 10_000
+
+
+# Method to turn a record into a hashable key, so that e.g. 3, 3.0 and np.int64(3) or NaN and None hit the same entry
+def record_key(record):
+    key = []
+    for column in FEATURE_COLUMNS:
+        value = record[column]
+        if value is None or value != value:
+            key.append(None)
+        elif column in CATEGORICAL_FEATURES:
+            key.append(str(value))
+        else:
+            key.append(float(value))
+    return tuple(key)
+
+
+class PredictionCache:
+    def __init__(self, scorer, version, max_size=CACHE_SIZE):
+        self.scorer = scorer
+        self.version = version
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    # Method to score one record, returns the predicted class and the probability of 'Dissatisfied'
+    def predict_record(self, record):
+        key = record_key(record)
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+        if result is not None:
+            count(PREDICTION_CACHE_METRIC, cache='record', result='hit')
+            return result
+
+        result = self.scorer.predict_record(record)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = result
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+        count(PREDICTION_CACHE_METRIC, cache='record', result='miss')
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_lock = threading.Lock()
+_caches = {}
+
+
+# Method to get the prediction cache of a model artifact, replaced by an empty cache when the model changes
+def get_prediction_cache(path=MODEL_PATH):
+    path = os.path.abspath(path)
+    version = artifact_version(path)
+    cached = _caches.get(path)
+    if cached is not None and cached.version == version:
+        return cached
+
+    with _lock:
+        cached = _caches.get(path)
+        if cached is None or cached.version != version:
+            cached = PredictionCache(get_scorer(path), version)
+            _caches[path] = cached
+        return cached
+
+
+# Method to find the unique rows of a feature matrix, returns the index of the first occurrence of every unique
+# row and the position of every row in the unique rows
+def unique_rows(features):
+    features = np.ascontiguousarray(features)
+    # Every row is compared as one opaque block of bytes, much faster than np.unique(axis=0)
+    rows = features.view(np.dtype((np.void, features.dtype.itemsize * features.shape[1]))).ravel()
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return first, inverse.ravel()
+
+
+# Method to get the probability of 'Dissatisfied' of a feature matrix, scoring every unique row only once
+def predict_unique(scorer, features):
+    if len(features) < 2:
+        return scorer.predict_proba_features(features)
+    with timer('deduplicate'):
+        first, inverse = unique_rows(features)
+    count(PREDICTION_CACHE_METRIC, len(features) - len(first), cache='batch', result='hit')
+    count(PREDICTION_CACHE_METRIC, len(first), cache='batch', result='miss')
+    return scorer.predict_proba_features(features[first])[inverse]
@@ -0,0 +1,44 @@
+# schema.py
+# Column definitions shared by the dashboard pages, the data store and the scoring code
+
+# Raw dataset (Airline_customer_satisfaction.csv)
+TARGET_COLUMN = 'satisfaction'
+
+CATEGORICAL_FEATURES = ['Customer Type', 'Class', 'Type of Travel']
+
+SERVICE_FEATURES = ['Seat comfort', 'Food and drink', 'Inflight wifi service', 'Inflight entertainment',
+                    'Online support', 'Ease of Online booking', 'On-board service', 'Leg room service',
+                    'Baggage handling', 'Checkin service', 'Cleanliness', 'Online boarding']
+
+# Rating columns which are part of the dataset but not used by the model
+EXTRA_RATING_COLUMNS = ['Departure/Arrival time convenient', 'Gate location']
+
+NUMERICAL_FEATURES = ['Age', 'Flight Distance'] + SERVICE_FEATURES + ['Departure Delay in Minutes',
+                                                                      'Arrival Delay in Minutes']
+
+# The 19 input fields expected by the model (same order as the prediction and batch templates)
+FEATURE_COLUMNS = CATEGORICAL_FEATURES + NUMERICAL_FEATURES
+
+# Columns of the raw dataset in file order
+DATASET_COLUMNS = [TARGET_COLUMN, 'Customer Type', 'Age', 'Type of Travel', 'Class', 'Flight Distance',
+                   'Seat comfort', 'Departure/Arrival time convenient', 'Food and drink', 'Gate location',
+                   'Inflight wifi service', 'Inflight entertainment', 'Online support', 'Ease of Online booking',
+                   'On-board service', 'Leg room service', 'Baggage handling', 'Checkin service', 'Cleanliness',
+                   'Online boarding', 'Departure Delay in Minutes', 'Arrival Delay in Minutes']
+
+# Compact dtypes used for the columnar copy of the dataset. Ratings are 0-5 and fit into int8,
+# 'Arrival Delay in Minutes' contains missing values and therefore stays a float.
+DATASET_DTYPES = {
+    TARGET_COLUMN: 'category',
+    'Customer Type': 'category',
+    'Class': 'category',
+    'Type of Travel': 'category',
+    'Age': 'int16',
+    'Flight Distance': 'int32',
+    'Departure Delay in Minutes': 'int32',
+    'Arrival Delay in Minutes': 'float64',
+}
+DATASET_DTYPES.update({column: 'int8' for column in SERVICE_FEATURES + EXTRA_RATING_COLUMNS})
+
+# Model output (class 1 of the XGBoost model means the customer is dissatisfied)
+LABELS = ['Satisfied', 'Dissatisfied']
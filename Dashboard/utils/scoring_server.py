@@ -0,0 +1,226 @@
+# scoring_server.py
+# Standalone HTTP scoring service for the XGBoost model.
+#
+# Requests are accepted by an asyncio server (standard library only) and coalesced into small batches:
+# the first request of a batch opens a window of --batch-window-ms milliseconds (or until --max-batch-size
+# records are queued), then all queued records are scored with a single booster call.
+#
+# Start it from the Dashboard directory:
+#     python -m utils.scoring_server --port 8765 --batch-window-ms 2
+#
+# POST /predict accepts one record (a JSON object with the same 19 fields as the prediction page) or a list
+# of records and returns {"label": "Satisfied" | "Dissatisfied", "probability": <p(Dissatisfied)>} for each.
+# GET /health returns the model version and batching statistics.
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils.fast_scorer import get_scorer
+from utils.schema import LABELS
+
+MAX_BODY_BYTES = 1 << 20
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class MicroBatcher:
+    def __init__(self, batch_window, max_batch_size):
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.queue = asyncio.Queue()
+        # The booster is called from a single worker thread, batches are scored one after another
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.records = 0
+
+    # Method to queue an encoded record for the next batch, returns a future with (label, probability)
+    def submit(self, features):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((features, future))
+        return future
+
+    # Method to collect queued records into batches and score them, runs for the lifetime of the server
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    # Take whatever is already queued without waiting any longer
+                    while len(batch) < self.max_batch_size and not self.queue.empty():
+                        batch.append(self.queue.get_nowait())
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            features = np.stack([item[0] for item in batch])
+            try:
+                scorer = get_scorer()
+                probabilities = await loop.run_in_executor(self.executor, scorer.predict_proba_features, features)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            self.batches += 1
+            self.records += len(batch)
+            for (_, future), probability in zip(batch, probabilities.tolist()):
+                if not future.done():
+                    future.set_result((LABELS[int(probability > scorer.threshold)], probability))
+
+
+class ScoringServer:
+    def __init__(self, batch_window_ms=2.0, max_batch_size=256):
+        self.batcher = MicroBatcher(batch_window_ms / 1000, max_batch_size)
+        self.started_at = time.time()
+
+    async def predict(self, body):
+        payload = json.loads(body)
+        records = payload if isinstance(payload, list) else [payload]
+        # All records are encoded before any is queued, so a request with an invalid record scores nothing
+        scorer = get_scorer()
+        try:
+            features = [scorer.encode_record(record) for record in records]
+        except KeyError as exc:
+            return 400, {'error': f"Missing field {exc}"}
+        except (TypeError, ValueError) as exc:
+            return 400, {'error': f"Invalid record: {exc}"}
+        futures = [self.batcher.submit(row) for row in features]
+
+        results = [{'label': label, 'probability': probability}
+                   for label, probability in await asyncio.gather(*futures)]
+        return 200, results if isinstance(payload, list) else results[0]
+
+    def health(self):
+        scorer = get_scorer()
+        batches = self.batcher.batches
+        return 200, {
+            'status': 'ok',
+            'model_version': scorer.version,
+            'model_format': scorer.source,
+            'model_load_seconds': scorer.load_seconds,
+            'uptime_seconds': time.time() - self.started_at,
+            'batch_window_ms': self.batcher.batch_window * 1000,
+            'max_batch_size': self.batcher.max_batch_size,
+            'batches': batches,
+            'records': self.batcher.records,
+            'mean_batch_size': self.batcher.records / batches if batches else 0.0
+        }
+
+    async def route(self, method, path, body):
+        if path == '/predict':
+            if method != 'POST':
+                return 405, {'error': "Use POST"}
+            return await self.predict(body)
+        if path == '/health':
+            return self.health()
+        return 404, {'error': f"Unknown path {path}"}
+
+    # Method to write a JSON response
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive):
+        response = json.dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(response)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + response)
+        await writer.drain()
+
+    # Method to serve one HTTP/1.1 connection (with keep-alive) until the client closes it
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    # The rest of the request cannot be parsed without a request line, answer and close
+                    await self.respond(writer, 400, {'error': "Malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.respond(writer, 400, {'error': "Invalid Content-Length"}, keep_alive=False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    status, payload = 413, {'error': "Request body too large"}
+                    body = None
+                else:
+                    body = await reader.readexactly(length) if length else b''
+
+                if body is not None:
+                    try:
+                        status, payload = await self.route(method, path.split('?', 1)[0], body)
+                    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+                        status, payload = 400, {'error': f"Invalid JSON: {exc}"}
+                    except Exception as exc:
+                        status, payload = 500, {'error': str(exc)}
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and body is not None
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        batch_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        print(f"Scoring server listening on http://{host}:{port} "
+              f"(batch window {self.batcher.batch_window * 1000:g} ms, max batch size {self.batcher.max_batch_size})",
+              flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP scoring service for the customer satisfaction model")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--batch-window-ms', type=float, default=2.0,
+                        help="How long the first request of a batch waits for more requests")
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Load and compile the model before accepting connections
+    get_scorer()
+    server = ScoringServer(args.batch_window_ms, args.max_batch_size)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# segment_cube.py
+# Pre-aggregated segment cube for the Detailed Analysis page.
+#
+# The filters of the page only select customer segments (Customer Type x Type of Travel x Class x Age), so the
+# dataset is aggregated once into one cell per segment and satisfaction value, holding the number of customers,
+# the sums needed for the averages and a histogram of every service rating. All KPIs and distribution charts are
+# then derived from the matching cells instead of the rows. The cube is rebuilt when the dataset changes.
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.data_store import DATA_PATH, dataset_version, load_dataset
+from utils.instrumentation import timer
+from utils.schema import SERVICE_FEATURES, TARGET_COLUMN
+
+DIMENSIONS = ['Customer Type', 'Type of Travel', 'Class', 'Age', TARGET_COLUMN]
+SUM_COLUMNS = ['Departure Delay in Minutes', 'Arrival Delay in Minutes', 'Flight Distance', 'Age']
+RATING_VALUES = range(6)
+
+AGE_BINS = [0, 18, 25, 35, 45, 55, 65, 100]
+AGE_LABELS = ['<18', '18-25', '25-35', '35-45', '45-55', '55-65', '65+']
+
+
+# Method to get the name of the cube column counting the customers who gave a service a certain rating
+def rating_column(feature, value):
+    return f"{feature}={value}"
+
+
+# Method to aggregate the dataset into the segment cube
+def build_cube(df):
+    columns = {'count': np.ones(len(df), dtype=np.int64)}
+    for column in SUM_COLUMNS:
+        columns[f"sum {column}"] = np.nan_to_num(df[column].to_numpy(dtype=np.float64))
+    # Missing arrival delays are skipped when averaging, so they need their own count
+    columns['count Arrival Delay in Minutes'] = df['Arrival Delay in Minutes'].notna().to_numpy(dtype=np.int64)
+    for feature in SERVICE_FEATURES:
+        ratings = df[feature].to_numpy()
+        for value in RATING_VALUES:
+            columns[rating_column(feature, value)] = (ratings == value).astype(np.int64)
+
+    measures = pd.DataFrame(columns, index=df.index)
+    keys = [df[dimension] for dimension in DIMENSIONS]
+    return measures.groupby(keys, observed=True, sort=True).sum().reset_index()
+
+
+_lock = threading.Lock()
+_cubes = {}
+
+
+# Method to get the cube of the current dataset, rebuilt only when the dataset changes
+def get_cube(path=DATA_PATH):
+    version = dataset_version(path)
+    cached = _cubes.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _cubes.get(path)
+        if cached is None or cached[0] != version:
+            df = load_dataset(path)
+            with timer('segment_cube_build'):
+                cached = (version, build_cube(df))
+            _cubes[path] = cached
+        return cached[1]
+
+
+# Method to select the cells of the cube matching the sidebar filters
+def filter_cells(cube, customer_types, travel_types, classes, age_range):
+    mask = (cube['Customer Type'].isin(customer_types) &
+            cube['Type of Travel'].isin(travel_types) &
+            cube['Class'].isin(classes) &
+            (cube['Age'] >= age_range[0]) &
+            (cube['Age'] <= age_range[1]))
+    cells = cube[mask]
+    # Drop the categories excluded by the filters so that they do not show up in the charts
+    for column in ['Customer Type', 'Type of Travel', 'Class', TARGET_COLUMN]:
+        cells = cells.assign(**{column: cells[column].cat.remove_unused_categories()})
+    return cells
+
+
+# Method to calculate the key metrics of the selected customers
+def key_metrics(cells):
+    count = cells['count'].sum()
+    arrival_count = cells['count Arrival Delay in Minutes'].sum()
+    return {
+        'avg_departure_delay': cells['sum Departure Delay in Minutes'].sum() / count,
+        'avg_arrival_delay': cells['sum Arrival Delay in Minutes'].sum() / arrival_count,
+        'avg_flight_distance': cells['sum Flight Distance'].sum() / count,
+        'avg_customer_age': cells['sum Age'].sum() / count,
+        'percent_satisfied': cells.loc[cells[TARGET_COLUMN] == 'satisfied', 'count'].sum() / count * 100,
+        'most_booked_class': distribution(cells, 'Class').idxmax()
+    }
+
+
+# Method to count the selected customers per value of a column, sorted like value_counts
+def distribution(cells, column):
+    counts = cells.groupby(column, observed=True)['count'].sum()
+    return counts.sort_values(ascending=False, kind='stable')
+
+
+# Method to count the selected customers per age (for the age histogram)
+def age_counts(cells):
+    return cells.groupby('Age')['count'].sum()
+
+
+# Method to calculate the percentage of satisfied and dissatisfied customers in each age group
+def age_group_satisfaction(cells):
+    age_group = pd.cut(cells['Age'], bins=AGE_BINS, labels=AGE_LABELS, right=False)
+    counts = cells.groupby([age_group, cells[TARGET_COLUMN]], observed=False)['count'].sum().unstack(fill_value=0)
+    counts.index.name = 'Age Group'
+    totals = counts.sum(axis=1)
+    return counts.div(totals.where(totals > 0), axis=0).fillna(0) * 100
+
+
+# Method to get the histogram (number of customers per rating 0-5) of a service for each satisfaction value
+def rating_histograms(cells, feature):
+    columns = [rating_column(feature, value) for value in RATING_VALUES]
+    histograms = cells.groupby(TARGET_COLUMN, observed=True)[columns].sum()
+    histograms.columns = list(RATING_VALUES)
+    return histograms
@@ -0,0 +1,159 @@
+# synthetic_data.py
+# Generator of synthetic airline customer satisfaction data for tests and benchmarks.
+#
+# The generated files have the same columns, value ranges and category labels as
+# Airline_customer_satisfaction.csv (dataset files) or the batch prediction template (template files).
+# Ratings are driven by a hidden per-customer satisfaction so that they are correlated with each other and with
+# the label, delays are mostly zero with a long tail, and a small share of arrival delays is missing. Rows are
+# generated in fixed blocks with their own random streams, so a given seed and number of rows always produce
+# the same data, and files of 10M rows are written without holding them in memory.
+#
+# Command line usage from the Dashboard directory:
+#     python -m utils.synthetic_data data/synthetic_1m.csv --rows 1000000
+#     python -m utils.synthetic_data surveys/template.xlsx --rows 10000 --template
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.schema import (DATASET_COLUMNS, DATASET_DTYPES, EXTRA_RATING_COLUMNS, FEATURE_COLUMNS,
+                          SERVICE_FEATURES, TARGET_COLUMN)
+
+BLOCK_SIZE = 100_000
+OUTPUT_FORMATS = ['csv', 'parquet', 'xlsx']
+# Excel sheets hold at most 1,048,576 rows including the header
+MAX_XLSX_ROWS = 1_048_575
+
+CUSTOMER_TYPES = (['Loyal Customer', 'disloyal Customer'], [0.82, 0.18])
+TRAVEL_TYPES = (['Business travel', 'Personal Travel'], [0.69, 0.31])
+CLASSES = (['Business', 'Eco', 'Eco Plus'], [0.48, 0.45, 0.07])
+SATISFACTION = ['dissatisfied', 'satisfied']
+MISSING_ARRIVAL_DELAY = 0.003
+
+
+def _choice(rng, values, n_rows):
+    categories, probabilities = values
+    return pd.Categorical.from_codes(rng.choice(len(categories), size=n_rows, p=probabilities), categories)
+
+
+def _ratings(rng, latent, n_rows):
+    weight = rng.uniform(0.5, 1.3)
+    ratings = np.rint(2.8 + weight * latent + rng.normal(0, 1.1, n_rows))
+    return np.clip(ratings, 0, 5).astype(np.int8)
+
+
+# Method to generate one block of rows, block_index selects the random stream
+def generate_block(n_rows, seed=0, block_index=0):
+    rng = np.random.default_rng([seed, block_index])
+    latent = rng.normal(0, 1, n_rows)
+    customer_type = _choice(rng, CUSTOMER_TYPES, n_rows)
+    travel_type = _choice(rng, TRAVEL_TYPES, n_rows)
+    travel_class = _choice(rng, CLASSES, n_rows)
+
+    df = pd.DataFrame({
+        'Customer Type': customer_type,
+        'Age': np.clip(np.rint(rng.normal(40, 15, n_rows)), 7, 85).astype(np.int16),
+        'Type of Travel': travel_type,
+        'Class': travel_class,
+        'Flight Distance': np.clip(np.rint(rng.gamma(4.0, 500.0, n_rows)), 50, 6951).astype(np.int32),
+    })
+    for column in SERVICE_FEATURES + EXTRA_RATING_COLUMNS:
+        df[column] = _ratings(rng, latent, n_rows)
+
+    delayed = rng.random(n_rows) < 0.44
+    departure_delay = np.where(delayed, np.rint(rng.exponential(30, n_rows)), 0)
+    arrival_delay = np.maximum(0, np.rint(departure_delay + rng.normal(0, 8, n_rows) * delayed))
+    arrival_delay[rng.random(n_rows) < MISSING_ARRIVAL_DELAY] = np.nan
+    df['Departure Delay in Minutes'] = np.minimum(departure_delay, 1600).astype(np.int32)
+    df['Arrival Delay in Minutes'] = np.minimum(arrival_delay, 1600)
+
+    logit = (2.0 * latent + 0.8 * (customer_type == 'Loyal Customer') + 0.5 * (travel_class == 'Business') -
+             0.6 - 0.01 * df['Departure Delay in Minutes'].to_numpy())
+    satisfied = rng.random(n_rows) < 1 / (1 + np.exp(-logit))
+    df[TARGET_COLUMN] = pd.Categorical.from_codes(satisfied.astype(np.int8), SATISFACTION)
+    return df[DATASET_COLUMNS].astype(DATASET_DTYPES)
+
+
+# Method to generate a dataset with n_rows rows as a sequence of DataFrames of at most block_size rows
+def iter_blocks(n_rows, seed=0, block_size=BLOCK_SIZE):
+    for block_index, start in enumerate(range(0, n_rows, block_size)):
+        yield generate_block(min(block_size, n_rows - start), seed, block_index)
+
+
+# Method to generate a whole dataset in memory
+def generate(n_rows, seed=0):
+    return pd.concat(iter_blocks(n_rows, seed), ignore_index=True)
+
+
+# Method to turn dataset rows into batch prediction template rows (the 19 input fields in template order)
+def template_rows(df):
+    return df[FEATURE_COLUMNS]
+
+
+def output_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported file type '{extension}', expected one of {', '.join(OUTPUT_FORMATS)}")
+    return extension
+
+
+# Method to write a synthetic dataset (or batch template with template=True) block by block, returns the path
+def write(path, n_rows, seed=0, template=False):
+    file_format = output_format(path)
+    if file_format == 'xlsx' and n_rows > MAX_XLSX_ROWS:
+        raise ValueError(f"Excel files hold at most {MAX_XLSX_ROWS} rows")
+
+    blocks = (template_rows(block) if template else block for block in iter_blocks(n_rows, seed))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if file_format == 'csv':
+        for i, block in enumerate(blocks):
+            block.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    elif file_format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for block in blocks:
+                table = pa.Table.from_pandas(block, preserve_index=False)
+                writer = writer or pq.ParquetWriter(path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        header_written = False
+        for block in blocks:
+            if not header_written:
+                sheet.append(list(block.columns))
+                header_written = True
+            for row in block.astype(object).where(block.notna(), None).itertuples(index=False):
+                sheet.append(list(row))
+        workbook.save(path)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic airline customer satisfaction data")
+    parser.add_argument('output', help="Output file (csv, parquet or xlsx)")
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--template', action='store_true',
+                        help="Write the 19 fields of the batch prediction template instead of the full dataset")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    write(args.output, args.rows, args.seed, args.template)
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
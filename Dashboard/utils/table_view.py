@@ -0,0 +1,136 @@
+# table_view.py
+# Windowed access to the shared dataset for the dataset table on the Overview page.
+#
+# Only the rows of the visible page are taken from the shared frame. Filters on the categorical columns use an
+# index (row positions per category) and sorting uses a cached sort order per column, both built once per
+# dataset version, so paging through a large dataset does not touch every row on each rerun.
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.data_store import DATA_PATH, dataset_version, load_dataset
+from utils.instrumentation import timer
+
+# Number of rows checked at a time when looking for the rows of a filtered page
+SCAN_BLOCK = 1 << 18
+MAX_CACHED_MASKS = 8
+
+_lock = threading.Lock()
+_indexes = {}
+
+
+class TableIndex:
+    def __init__(self, df):
+        self.df = df
+        self.n_rows = len(df)
+        # Row positions of every category, for each categorical column
+        self.category_rows = {}
+        for column in df.columns:
+            if df[column].dtype.name == 'category':
+                codes = df[column].cat.codes.to_numpy()
+                order = np.argsort(codes, kind='stable')
+                bounds = np.searchsorted(codes[order], np.arange(len(df[column].cat.categories) + 1))
+                self.category_rows[column] = {category: order[bounds[i]:bounds[i + 1]]
+                                              for i, category in enumerate(df[column].cat.categories)}
+        # The index is shared by all sessions, the caches below are only touched while holding the lock
+        self._lock = threading.Lock()
+        self.sort_orders = {}
+        self.masks = OrderedDict()
+
+    # Method to get the row positions which sort the frame by a column like a stable sort_values with missing
+    # values last, built on first use
+    def sort_order(self, column, ascending=True):
+        with self._lock:
+            order = self.sort_orders.get((column, ascending))
+        if order is not None:
+            return order
+
+        values = self.df[column]
+        if values.dtype.name == 'category':
+            keys = values.cat.codes.to_numpy().astype(np.float64)
+            keys[keys < 0] = np.nan
+        else:
+            keys = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        # NaN is sorted to the end in both directions
+        order = np.argsort(keys if ascending else -keys, kind='stable')
+        with self._lock:
+            return self.sort_orders.setdefault((column, ascending), order)
+
+    # Method to get a boolean mask of the rows matching the selected categories, None if nothing is filtered.
+    # The masks of the last few filter selections are kept, so paging does not rebuild them.
+    def filter_mask(self, filters):
+        active = tuple(sorted((column, tuple(sorted(map(str, selected)))) for column, selected in filters.items()
+                              if not set(selected) >= set(self.category_rows[column])))
+        if not active:
+            return None
+        with self._lock:
+            mask = self.masks.get(active)
+            if mask is not None:
+                self.masks.move_to_end(active)
+                return mask
+
+        mask = None
+        for column, _ in active:
+            categories = self.category_rows[column]
+            column_mask = np.zeros(self.n_rows, dtype=bool)
+            for category in filters[column]:
+                column_mask[categories[category]] = True
+            mask = column_mask if mask is None else mask & column_mask
+        with self._lock:
+            self.masks[active] = mask
+            self.masks.move_to_end(active)
+            while len(self.masks) > MAX_CACHED_MASKS:
+                self.masks.popitem(last=False)
+        return mask
+
+    # Method to count the rows matching the selected categories
+    def count(self, filters=None):
+        mask = self.filter_mask(filters or {})
+        return self.n_rows if mask is None else int(np.count_nonzero(mask))
+
+    # Method to get one page of the (filtered and sorted) frame
+    def page(self, page, page_size, columns=None, filters=None, sort_by=None, ascending=True):
+        columns = list(columns) if columns else list(self.df.columns)
+        mask = self.filter_mask(filters or {})
+        start = page * page_size
+        order = self.sort_order(sort_by, ascending) if sort_by is not None else None
+
+        if mask is None:
+            positions = order[start:start + page_size] if order is not None else np.arange(
+                start, min(start + page_size, self.n_rows))
+            return self.df.iloc[positions][columns]
+
+        # Scan the rows block by block (in sort order) until the requested page is filled
+        needed = start + page_size
+        found = []
+        n_found = 0
+        for block_start in range(0, self.n_rows, SCAN_BLOCK):
+            if order is None:
+                hits = np.flatnonzero(mask[block_start:block_start + SCAN_BLOCK]) + block_start
+            else:
+                block = order[block_start:block_start + SCAN_BLOCK]
+                hits = block[mask[block]]
+            found.append(hits)
+            n_found += len(hits)
+            if n_found >= needed:
+                break
+        positions = np.concatenate(found)[start:needed] if found else np.empty(0, dtype=np.int64)
+        return self.df.iloc[positions][columns]
+
+
+# Method to get the table index of the current dataset, rebuilt only when the dataset changes
+def get_table_index(path=DATA_PATH):
+    version = dataset_version(path)
+    cached = _indexes.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != version:
+            df = load_dataset(path)
+            with timer('table_index_build'):
+                cached = (version, TableIndex(df))
+            _indexes[path] = cached
+        return cached[1]
@@ -0,0 +1,384 @@
+# train_model.py
+# Training pipeline which regenerates the model artifact (pages/xgboost.pkl) from the dataset.
+#
+# The pipeline has the same structure as the shipped model: a ColumnTransformer with most frequent imputation
+# and one-hot encoding of the categorical fields and mean imputation and standard scaling of the numerical
+# fields, followed by an XGBClassifier (class 1 = dissatisfied). Trees are grown with the histogram method. A
+# small grid of hyperparameters around the shipped ones is compared with stratified k-fold cross-validation on
+# AUC (xgb.cv on all cores), each candidate with early stopping, and the best model is evaluated on a stratified
+# hold-out set. The wall-clock time of every stage is reported.
+#
+# With --external-memory the data is streamed from the CSV in chunks instead: the preprocessor and the
+# hyperparameter search use a uniform random sample, and the final booster is trained on an external-memory
+# DMatrix built from an iterator over the chunks (with early stopping on the hold-out rows), so the dataset does
+# not need to fit into RAM.
+#
+# With --classifier the other models of the README (decision tree, logistic regression, MLP, SVC) are trained
+# on the same split and saved as pages/<name>.pkl for the model zoo (see model_zoo). They reuse the fitted
+# preprocessor of the shipped model, so that the zoo transforms every batch only once for all models.
+#
+# Command line usage from the Dashboard directory:
+#     python -m utils.train_model --output pages/xgboost.pkl --force --report training_report.json
+#     python -m utils.train_model --data data/synthetic_10m.csv --external-memory --output model.pkl
+#     python -m utils.train_model --classifier logistic_regression
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import train_test_split
+from sklearn.neural_network import MLPClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.svm import SVC
+from sklearn.tree import DecisionTreeClassifier
+from xgboost import XGBClassifier
+
+from utils.data_store import DATA_PATH, load_dataset
+from utils.instrumentation import timer
+from utils.model_registry import MODEL_PATH
+from utils.model_zoo import MODEL_NAMES, model_path
+from utils.schema import FEATURE_COLUMNS, NUMERICAL_FEATURES, TARGET_COLUMN
+
+# Validation AUC of the best model reported in the README
+README_AUC = 0.992
+RANDOM_STATE = 42
+VALIDATION_FRACTION = 0.2
+CV_FOLDS = 5
+EARLY_STOPPING_ROUNDS = 20
+MAX_ROUNDS = 1000
+# Grid around the parameters of the shipped model (max_depth=7, learning_rate=0.1, reg_alpha=0.1)
+PARAM_GRID = {'max_depth': [5, 7, 9], 'learning_rate': [0.1, 0.2], 'reg_alpha': [0.1]}
+# Order of the categorical fields in the shipped preprocessor
+CATEGORICAL_ORDER = ['Customer Type', 'Type of Travel', 'Class']
+# Out-of-core mode: rows per CSV chunk and size of the sample used for the preprocessor and the search
+CHUNK_SIZE = 200_000
+SAMPLE_ROWS = 200_000
+# Kernel SVC training grows quadratically with the number of rows, it is trained on a stratified sample
+SVC_MAX_ROWS = 20_000
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        with timer(f'train_{name}'):
+            yield
+        self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+        print(f"[{name}] {self.seconds[name]:.2f} s", flush=True)
+
+
+# Method to get the labels of the model (1 = dissatisfied) from the satisfaction column
+def labels(df):
+    return (df[TARGET_COLUMN] == 'dissatisfied').to_numpy(dtype=np.int32)
+
+
+def build_preprocessor():
+    categorical = Pipeline([('imputer', SimpleImputer(strategy='most_frequent')),
+                            ('ohe', OneHotEncoder(sparse_output=False))])
+    numerical = Pipeline([('imputer', SimpleImputer()), ('scaler', StandardScaler())])
+    return ColumnTransformer([('cat', categorical, CATEGORICAL_ORDER), ('num', numerical, NUMERICAL_FEATURES)],
+                             remainder='passthrough')
+
+
+def build_classifier(params, n_estimators, n_jobs=None):
+    return XGBClassifier(tree_method='hist', n_estimators=n_estimators, random_state=RANDOM_STATE, n_jobs=n_jobs,
+                         **params)
+
+
+# Method to build one of the other classifiers of the README (TPOT is an AutoML search, not a fixed model)
+def build_zoo_classifier(name):
+    if name == 'decision_tree':
+        return DecisionTreeClassifier(max_depth=12, min_samples_leaf=20, random_state=RANDOM_STATE)
+    if name == 'logistic_regression':
+        return LogisticRegression(max_iter=1000)
+    if name == 'mlp':
+        return MLPClassifier(hidden_layer_sizes=(64, 32), early_stopping=True, random_state=RANDOM_STATE)
+    if name == 'svc':
+        return SVC(probability=True, random_state=RANDOM_STATE)
+    raise ValueError(f"Unknown classifier '{name}', expected one of {', '.join(MODEL_NAMES)}")
+
+
+def param_candidates(grid=PARAM_GRID):
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+def booster_params(params, n_jobs):
+    return {'objective': 'binary:logistic', 'eval_metric': 'auc', 'tree_method': 'hist', 'nthread': n_jobs,
+            'seed': RANDOM_STATE, **params}
+
+
+# Method to compare the candidates with k-fold cross-validation, returns the best candidate (with its number of
+# rounds) and the results of all candidates
+def search(dtrain, candidates, folds=CV_FOLDS, n_jobs=None):
+    results = []
+    for params in candidates:
+        history = xgb.cv(booster_params(params, n_jobs), dtrain, num_boost_round=MAX_ROUNDS, nfold=folds,
+                         stratified=True, early_stopping_rounds=EARLY_STOPPING_ROUNDS, seed=RANDOM_STATE)
+        result = {**params, 'rounds': len(history), 'cv_auc': float(history['test-auc-mean'].iloc[-1]),
+                  'cv_auc_std': float(history['test-auc-std'].iloc[-1])}
+        results.append(result)
+        print(f"  {params}: {result['rounds']} rounds, CV AUC {result['cv_auc']:.5f} "
+              f"(+/- {result['cv_auc_std']:.5f})", flush=True)
+    best = max(results, key=lambda result: result['cv_auc'])
+    return best, results
+
+
+def _split_params(best):
+    params = {name: best[name] for name in PARAM_GRID}
+    return params, best['rounds']
+
+
+# Method to evaluate predicted probabilities of 'Dissatisfied' against the labels
+def evaluate(y_true, probabilities):
+    auc = roc_auc_score(y_true, probabilities)
+    return {'validation_auc': float(auc), 'validation_accuracy': float(accuracy_score(y_true, probabilities > 0.5)),
+            'readme_auc': README_AUC, 'auc_difference': float(auc - README_AUC)}
+
+
+# Method to train on a dataset held in memory, returns the pipeline and the report
+def train_in_memory(df, stages, folds=CV_FOLDS, n_jobs=None, candidates=None):
+    with stages('split'):
+        y = labels(df)
+        X_train, X_val, y_train, y_val = train_test_split(df[FEATURE_COLUMNS], y, test_size=VALIDATION_FRACTION,
+                                                          stratify=y, random_state=RANDOM_STATE)
+    with stages('preprocess'):
+        preprocessor = build_preprocessor().fit(X_train)
+        train_features = preprocessor.transform(X_train)
+        dtrain = xgb.DMatrix(train_features, label=y_train, nthread=n_jobs or -1)
+    with stages('search'):
+        # The folds share the preprocessor fitted on the whole training split, imputation and scaling do not
+        # change the splits a tree can make, so this does not leak information into the validation folds
+        best, results = search(dtrain, candidates or param_candidates(), folds, n_jobs)
+    with stages('train'):
+        params, rounds = _split_params(best)
+        classifier = build_classifier(params, rounds, n_jobs).fit(train_features, y_train)
+        model = Pipeline([('preprocessor', preprocessor), ('classifier', classifier)])
+    with stages('evaluate'):
+        probabilities = model.predict_proba(X_val)[:, 1]
+        report = evaluate(y_val, probabilities)
+        report.update(compare_with_artifact(X_val, y_val, model))
+    report.update({'mode': 'in-memory', 'train_rows': len(X_train), 'validation_rows': len(X_val),
+                   'best_params': params, 'rounds': rounds, 'search': results})
+    return model, report
+
+
+# Method to train another classifier of the model zoo on the same split as the XGBoost model, returns the pipeline
+# and the report. The fitted preprocessor of shared_model is reused when given.
+def train_zoo_model(df, name, stages, shared_model=None):
+    with stages('split'):
+        y = labels(df)
+        X_train, X_val, y_train, y_val = train_test_split(df[FEATURE_COLUMNS], y, test_size=VALIDATION_FRACTION,
+                                                          stratify=y, random_state=RANDOM_STATE)
+    with stages('preprocess'):
+        if shared_model is not None:
+            preprocessor = shared_model.named_steps['preprocessor']
+        else:
+            preprocessor = build_preprocessor().fit(X_train)
+        train_features = preprocessor.transform(X_train)
+        if name == 'svc' and len(train_features) > SVC_MAX_ROWS:
+            train_features, _, y_train, _ = train_test_split(train_features, y_train, train_size=SVC_MAX_ROWS,
+                                                             stratify=y_train, random_state=RANDOM_STATE)
+    with stages('train'):
+        classifier = build_zoo_classifier(name).fit(train_features, y_train)
+        model = Pipeline([('preprocessor', preprocessor), ('classifier', classifier)])
+    with stages('evaluate'):
+        report = evaluate(y_val, model.predict_proba(X_val)[:, 1])
+        report.update(compare_with_artifact(X_val, y_val, model))
+    report.update({'mode': 'zoo', 'classifier': name, 'train_rows': len(train_features),
+                   'validation_rows': len(X_val), 'shared_preprocessor': shared_model is not None})
+    return model, report
+
+
+# Method to compare the new model with the shipped artifact on the validation rows. The shipped model may have
+# seen some of these rows during its training, so its AUC here is an upper bound.
+def compare_with_artifact(X_val, y_val, model, path=MODEL_PATH):
+    if not os.path.exists(path):
+        return {}
+    shipped = joblib.load(path)
+    shipped_probabilities = shipped.predict_proba(X_val)[:, 1]
+    agreement = np.mean((shipped_probabilities > 0.5) == (model.predict_proba(X_val)[:, 1] > 0.5))
+    return {'shipped_model_auc': float(roc_auc_score(y_val, shipped_probabilities)),
+            'prediction_agreement': float(agreement)}
+
+
+# Method to assign the rows of a CSV chunk to the hold-out set, reproducible for a given chunk size
+def validation_mask(chunk_index, n_rows, fraction=VALIDATION_FRACTION):
+    return np.random.default_rng([RANDOM_STATE, chunk_index]).random(n_rows) < fraction
+
+
+def iter_csv(path, chunk_size=CHUNK_SIZE):
+    return pd.read_csv(path, chunksize=chunk_size)
+
+
+class ChunkIterator(xgb.DataIter):
+    # Iterator over the preprocessed training (or hold-out) rows of a CSV file, used to build an external-memory
+    # DMatrix: XGBoost calls next() until it returns 0 and writes the pages to the cache under cache_prefix
+    def __init__(self, path, preprocessor, validation, cache_prefix, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.preprocessor = preprocessor
+        self.validation = validation
+        self.chunk_size = chunk_size
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def reset(self):
+        self._chunks = enumerate(iter_csv(self.path, self.chunk_size))
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self.reset()
+        for chunk_index, chunk in self._chunks:
+            mask = validation_mask(chunk_index, len(chunk))
+            part = chunk[mask if self.validation else ~mask]
+            if len(part):
+                input_data(data=self.preprocessor.transform(part[FEATURE_COLUMNS]), label=labels(part))
+                return 1
+        return 0
+
+
+# Method to draw a uniform random sample of the training rows of a CSV file in one pass (the rows with the
+# smallest random keys are kept), returns the sample and the number of training and hold-out rows
+def sample_training_rows(path, sample_rows=SAMPLE_ROWS, chunk_size=CHUNK_SIZE):
+    rng = np.random.default_rng(RANDOM_STATE)
+    sample = None
+    train_rows = validation_rows = 0
+    for chunk_index, chunk in enumerate(iter_csv(path, chunk_size)):
+        mask = validation_mask(chunk_index, len(chunk))
+        validation_rows += int(mask.sum())
+        chunk = chunk[~mask]
+        train_rows += len(chunk)
+        chunk = chunk.assign(_key=rng.random(len(chunk)))
+        sample = chunk if sample is None else pd.concat([sample, chunk], ignore_index=True)
+        sample = sample.nsmallest(sample_rows, '_key')
+    return sample.drop(columns='_key').reset_index(drop=True), train_rows, validation_rows
+
+
+# Method to wrap a booster trained with xgb.train into the classifier step of the pipeline
+def wrap_booster(booster, params, n_jobs=None):
+    classifier = build_classifier(params, booster.num_boosted_rounds(), n_jobs)
+    classifier.load_model(bytearray(booster.save_raw(raw_format='ubj')))
+    classifier.n_classes_ = 2
+    return classifier
+
+
+# Method to train out-of-core from a CSV file, returns the pipeline and the report
+def train_external_memory(path, stages, folds=CV_FOLDS, n_jobs=None, candidates=None, chunk_size=CHUNK_SIZE,
+                          sample_rows=SAMPLE_ROWS):
+    cache_dir = tempfile.mkdtemp(prefix='xgboost-cache-')
+    try:
+        with stages('sample'):
+            sample, train_rows, validation_rows = sample_training_rows(path, sample_rows, chunk_size)
+        with stages('preprocess'):
+            preprocessor = build_preprocessor().fit(sample[FEATURE_COLUMNS])
+            dsample = xgb.DMatrix(preprocessor.transform(sample[FEATURE_COLUMNS]), label=labels(sample),
+                                  nthread=n_jobs or -1)
+        with stages('search'):
+            best, results = search(dsample, candidates or param_candidates(), folds, n_jobs)
+            params, _ = _split_params(best)
+        with stages('cache'):
+            dtrain = xgb.DMatrix(ChunkIterator(path, preprocessor, False, os.path.join(cache_dir, 'train'),
+                                               chunk_size))
+            dval = xgb.DMatrix(ChunkIterator(path, preprocessor, True, os.path.join(cache_dir, 'validation'),
+                                             chunk_size))
+        with stages('train'):
+            # The number of rounds found on the sample is only a lower bound for the full data, so training
+            # continues until the hold-out AUC stops improving
+            booster = xgb.train(booster_params(params, n_jobs), dtrain, num_boost_round=MAX_ROUNDS,
+                                evals=[(dval, 'validation')], early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                                verbose_eval=False)
+            booster = booster[:booster.best_iteration + 1]
+            model = Pipeline([('preprocessor', preprocessor), ('classifier', wrap_booster(booster, params, n_jobs))])
+        with stages('evaluate'):
+            report = evaluate(dval.get_label(), booster.predict(dval))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    report.update({'mode': 'external-memory', 'train_rows': train_rows, 'validation_rows': validation_rows,
+                   'sample_rows': len(sample), 'best_params': params, 'rounds': booster.num_boosted_rounds(),
+                   'search': results})
+    return model, report
+
+
+# Method to save the pipeline atomically, so that a running dashboard never loads a partial file
+def save_model(model, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the customer satisfaction model and save the pipeline")
+    parser.add_argument('--data', default=DATA_PATH, help="Dataset CSV (Airline_customer_satisfaction.csv format)")
+    parser.add_argument('--classifier', choices=list(MODEL_NAMES), default='xgboost',
+                        help="Model of the README to train (default: the shipped XGBoost model)")
+    parser.add_argument('--output', help="Where to write the pipeline (default: pages/<classifier>.pkl)")
+    parser.add_argument('--force', action='store_true', help="Overwrite the output if it exists already")
+    parser.add_argument('--own-preprocessor', action='store_true',
+                        help="Fit a new preprocessor instead of reusing the one of the shipped model")
+    parser.add_argument('--report', help="Optional JSON file for the training report")
+    parser.add_argument('--folds', type=int, default=CV_FOLDS)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="Threads used by XGBoost")
+    parser.add_argument('--external-memory', action='store_true',
+                        help="Stream the CSV in chunks and train on an external-memory DMatrix")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--sample-rows', type=int, default=SAMPLE_ROWS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.output = args.output or model_path(args.classifier)
+    # The default output is the artifact the dashboard serves, never replace it by accident
+    if os.path.exists(args.output) and not args.force:
+        raise SystemExit(f"{args.output} exists already, use --force to overwrite it or --output to write elsewhere")
+    stages = StageTimer()
+    start = time.perf_counter()
+    if args.classifier != 'xgboost':
+        if args.external_memory:
+            raise SystemExit("--external-memory is only supported for the XGBoost model")
+        with stages('load'):
+            df = load_dataset(args.data)
+            shared_model = None if args.own_preprocessor or not os.path.exists(MODEL_PATH) else \
+                joblib.load(MODEL_PATH)
+        model, report = train_zoo_model(df, args.classifier, stages, shared_model)
+    elif args.external_memory:
+        model, report = train_external_memory(args.data, stages, args.folds, args.jobs, chunk_size=args.chunk_size,
+                                              sample_rows=args.sample_rows)
+    else:
+        with stages('load'):
+            df = load_dataset(args.data)
+        model, report = train_in_memory(df, stages, args.folds, args.jobs)
+    with stages('save'):
+        save_model(model, args.output)
+
+    report.update({'data': os.path.abspath(args.data), 'output': os.path.abspath(args.output),
+                   'xgboost': xgb.__version__, 'stage_seconds': stages.seconds,
+                   'total_seconds': time.perf_counter() - start})
+    print(f"Validation AUC {report['validation_auc']:.5f} (README: {README_AUC}, "
+          f"difference {report['auc_difference']:+.5f}), accuracy {report['validation_accuracy']:.4f}")
+    if 'shipped_model_auc' in report:
+        print(f"Shipped model on the same rows: AUC {report['shipped_model_auc']:.5f}, "
+              f"prediction agreement {report['prediction_agreement']:.4f}")
+    print(f"Model written to {args.output} in {report['total_seconds']:.1f} s")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()